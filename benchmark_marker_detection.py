@@ -0,0 +1,128 @@
+# Compares the pyramid marker detection (`--marker-scale`) with the marker
+# detection on the full-resolution frame on recorded frames.
+#
+# For every scale, the corners of the markers found by both detectors are
+# compared and the detection latencies are measured, so a scale can be picked
+# which is fast enough without losing accuracy. The reference corners are
+# refined on the full-resolution frame like the ones of the scale they are
+# compared with, so the comparison only shows the error of the scaling.
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from utils.benchmark_utils import latency_report, load_frames
+from utils.marker_detection import MarkerDetector, PyramidMarkerDetector, \
+    refine_corners
+
+
+def run(detector, frames):
+    latencies, detections = [], []
+    for seq, frame in enumerate(frames):
+        start = time.perf_counter()
+        corners, ids = detector.detect(frame, seq)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        detections.append({} if ids is None else {
+            int(marker_id): marker_corners.reshape(4, 2)
+            for marker_id, marker_corners in zip(ids.ravel(), corners)
+        })
+
+    return np.array(latencies), detections
+
+
+def refine_reference(frames, reference, window_size):
+    refined = []
+    for frame, markers in zip(frames, reference):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        marker_ids = list(markers)
+        corners = refine_corners(gray, [markers[marker_id].reshape(1, 4, 2)
+                                        .astype(np.float32)
+                                        for marker_id in marker_ids],
+                                 window_size)
+        refined.append({marker_id: marker_corners.reshape(4, 2)
+                        for marker_id, marker_corners
+                        in zip(marker_ids, corners)})
+
+    return refined
+
+
+def corner_agreement(reference, candidate):
+    """Compares the corners of the markers found in the same frame by both
+    detectors."""
+    errors = []
+    total, matched, extra = 0, 0, 0
+    for reference_markers, candidate_markers in zip(reference, candidate):
+        total += len(reference_markers)
+        extra += len(set(candidate_markers) - set(reference_markers))
+        for marker_id, corners in reference_markers.items():
+            if marker_id not in candidate_markers:
+                continue
+            matched += 1
+            errors += list(np.linalg.norm(
+                candidate_markers[marker_id] - corners, axis=1))
+
+    errors = np.array(errors)
+    return {
+        'reference_markers': total,
+        'recall': matched / total if total else 1.,
+        'extra_markers': extra,
+        'mean_error_px': float(np.mean(errors)) if len(errors) else None,
+        'p95_error_px': float(np.percentile(errors, 95))
+        if len(errors) else None,
+        'max_error_px': float(np.max(errors)) if len(errors) else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-frames', '--frames', dest='frames', required=True,
+                        help='Directory of images or a video file with '
+                             'frames from the target camera.')
+    parser.add_argument('-n', '--max-frames', dest='max_frames', type=int,
+                        default=None, help='Maximum number of frames used.')
+    parser.add_argument('-scales', '--scales', dest='scales',
+                        type=lambda value: [float(scale) for scale
+                                            in value.split(',')],
+                        default=[.75, .5, .33],
+                        help='Comma separated scales to compare.')
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        help='File the JSON report is written to.')
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.max_frames)
+    if not frames:
+        raise ValueError("No frames found in {}.".format(args.frames))
+
+    print("Detecting markers at full resolution on {} frames..."
+          .format(len(frames)))
+    reference_latencies, reference = run(MarkerDetector(), frames)
+
+    report = {
+        'frames': len(frames),
+        'frame_size': list(frames[0].shape[1::-1]),
+        'full_resolution': {
+            'latency': latency_report(reference_latencies),
+        },
+        'scales': {},
+    }
+
+    for scale in args.scales:
+        print("Detecting markers at scale {}...".format(scale))
+        detector = PyramidMarkerDetector(scale)
+        latencies, detections = run(detector, frames)
+        report['scales'][str(scale)] = {
+            'latency': latency_report(latencies),
+            'corners': corner_agreement(
+                refine_reference(frames, reference, detector.window_size),
+                detections),
+        }
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
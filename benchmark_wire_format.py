@@ -0,0 +1,104 @@
+# Compares the msgpack messages of the publishers (`--zmq-format frame`) with
+# the compact binary format (`--zmq-format binary`): the time to encode and
+# decode the messages of a frame and their size.
+
+import argparse
+import json
+import time
+
+from queue import Queue
+
+import msgpack
+import numpy as np
+
+from utils import wire_format
+from utils.zmq_publisher import HandPositionPublisher, MarkerPublisher, \
+    PublisherConfig
+
+
+def random_hands(num_hands, rng):
+    return [{'confidence': float(rng.random()),
+             'box': rng.integers(0, 1920, 4).tolist(),
+             'palm_position': tuple(rng.random(2) * 1000)}
+            for _ in range(num_hands)]
+
+
+def random_markers(num_markers, rng):
+    return [{'id': int(marker_id),
+             'corners': rng.integers(0, 1920, (4, 2)).tolist()}
+            for marker_id in range(num_markers)]
+
+
+def encode_msgpack(publisher, frame_id, times, detections):
+    packet = publisher.create_frame_packet(frame_id, detections)
+    packet.update(times)
+    packet['publish_timestamp'] = publisher.timestamp()
+    return [msgpack.dumps(packet)]
+
+
+def encode_binary(publisher, frame_id, times, detections):
+    records = publisher.create_records(detections)
+    return [wire_format.encode_header(publisher.wire_kind, len(records),
+                                      frame_id, times['capture_timestamp'],
+                                      times['inference_timestamp'],
+                                      publisher.timestamp()),
+            records]
+
+
+def measure(publisher, frames, encode, decode):
+    times = {'capture_timestamp': publisher.timestamp(),
+             'inference_timestamp': publisher.timestamp()}
+
+    start = time.perf_counter()
+    messages = [encode(publisher, frame_id, times, detections)
+                for frame_id, detections in enumerate(frames)]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for parts in messages:
+        decode(parts)
+    decode_time = time.perf_counter() - start
+
+    sizes = [sum(memoryview(part).nbytes for part in parts)
+             for parts in messages]
+
+    return {
+        'encode_us': encode_time / len(frames) * 1e6,
+        'decode_us': decode_time / len(frames) * 1e6,
+        'bytes_per_frame': float(np.mean(sizes)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-frames', dest='num_frames', type=int,
+                        default=10000, help='Number of frames encoded.')
+    parser.add_argument('-nhands', '--num_hands', dest='num_hands', type=int,
+                        default=2, help='Number of hands per frame.')
+    parser.add_argument('-nmarkers', '--num-markers', dest='num_markers',
+                        type=int, default=8,
+                        help='Number of markers per frame.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # The publishers are only used to build the messages, nothing is sent.
+    config = PublisherConfig('inproc://benchmark-wire-format')
+    publishers = {
+        'hands': (HandPositionPublisher(Queue(), config=config),
+                  [random_hands(args.num_hands, rng)
+                   for _ in range(args.num_frames)]),
+        'markers': (MarkerPublisher(Queue(), config=config),
+                    [random_markers(args.num_markers, rng)
+                     for _ in range(args.num_frames)]),
+    }
+
+    report = {}
+    for name, (publisher, frames) in publishers.items():
+        report[name] = {
+            'msgpack': measure(publisher, frames, encode_msgpack,
+                               lambda parts: msgpack.loads(parts[0])),
+            'binary': measure(publisher, frames, encode_binary,
+                              wire_format.decode),
+        }
+
+    print(json.dumps(report, indent=2))
@@ -1,15 +1,26 @@
 import argparse
 import copy
+import time
 
-from multiprocessing import Queue
-from threading import Thread
+from queue import Queue
 from typing import List, Dict
 
 import cv2
 
 from utils import Worker, Calibration
+from utils.aoi import Aoi
+from utils.detector_backends import BACKENDS, create_detector
+from utils.detector_service import DetectorService
+from utils.frame_pipeline import FramePipeline
+from utils.frame_renderer import FrameRenderer
+from utils.hand_detection import create_hand_detector
+from utils.marker_scheduler import MarkerScheduler
+from utils.process_worker_pool import ProcessWorkerPool
+from utils.reorder_buffer import ReorderBuffer
+from utils.tiled_detector import parse_tile_layouts
 from utils.webcam_video_stream import WebcamVideoStream
-from utils.zmq_publisher import HandPositionPublisher, MarkerPublisher
+from utils.zmq_publisher import AoiPublisher, HandPositionPublisher, \
+    MarkerPublisher, PublisherConfig, ZmqPublisher
 from utils.synchronized_variable import SynchronizedVariable
 from lib.state_machine import StateMachine
 from lib.command_line_input import CommandLineInput
@@ -45,18 +56,231 @@ if __name__ == '__main__':
     parser.add_argument('-fps', '--fps', dest='fps', type=int, default=True,
                         help='Show FPS on detection/display visualization')
     parser.add_argument('-wd', '--width', dest='width', type=int, default=888,
-                        help='Width of the frames in the video stream.')
+                        help='Width of the displayed frames. The frames are '
+                             'processed at capture resolution.')
     parser.add_argument('-ht', '--height', dest='height', type=int,
                         default=500,
-                        help='Height of the frames in the video stream.')
+                        help='Height of the displayed frames. The frames are '
+                             'processed at capture resolution.')
     parser.add_argument('-ds', '--display', dest='display', type=int,
                         default=True,
                         help='Display the detected images using OpenCV. This '
                         'reduces FPS')
     parser.add_argument('-num-w', '--num-workers', dest='num_workers',
                         type=int, default=4, help='Number of workers.')
+    parser.add_argument('-hand-w', '--hand-workers', dest='hand_workers',
+                        type=int, default=None,
+                        help='Number of hand detection threads. Defaults to '
+                             'the number of workers.')
+    parser.add_argument('-marker-w', '--marker-workers', dest='marker_workers',
+                        type=int, default=None,
+                        help='Number of marker detection threads. Defaults to '
+                             'the number of workers.')
+    parser.add_argument('-w-mode', '--worker-mode', dest='worker_mode',
+                        choices=['thread', 'process'], default='thread',
+                        help='Run the workers as threads sharing one '
+                             'detector or as separate processes, which '
+                             'receive the frames through shared memory.')
+    parser.add_argument('-b', '--backend', dest='backend', choices=BACKENDS,
+                        default='tf',
+                        help='Runtime used to run the hand detector.')
+    parser.add_argument('-m', '--model', dest='model_path', default=None,
+                        help='Path to the model file for the selected '
+                             'backend.')
+    parser.add_argument('-b-threads', '--backend-threads',
+                        dest='backend_threads', type=int, default=None,
+                        help='Number of threads the detector backend may '
+                             'use.')
+    parser.add_argument('-no-xnnpack', '--no-xnnpack', dest='use_xnnpack',
+                        action='store_false',
+                        help='Disable the XNNPACK delegate of the TFLite '
+                             'backend.')
+    parser.add_argument('-det-int', '--detection-interval',
+                        dest='detection_interval', type=int, default=1,
+                        help='Maximum number of frames between two runs of '
+                             'the hand detector. Hands are tracked with '
+                             'optical flow in between, the actual interval '
+                             'adapts to their motion. Only with --worker-mode '
+                             'thread.')
+    parser.add_argument('-min-track-conf', '--min-tracking-confidence',
+                        dest='min_tracking_confidence', type=float,
+                        default=.5,
+                        help='Minimum share of successfully tracked points '
+                             'per hand before the detector is run again.')
+    parser.add_argument('-tiles', '--tiles', dest='tile_layouts',
+                        type=parse_tile_layouts, default=None,
+                        help='Run the hand detector on overlapping tiles, '
+                             'given as comma separated <columns>x<rows> '
+                             'grids, one per scale, e.g. 1x1,3x2.')
+    parser.add_argument('-tile-overlap', '--tile-overlap',
+                        dest='tile_overlap', type=float, default=.2,
+                        help='Overlap of neighbouring tiles, relative to '
+                             'the tile size.')
+    parser.add_argument('-roi', '--roi', dest='roi', action='store_true',
+                        help='Run the hand detector on crops around the '
+                             'hands of the previous frame instead of the '
+                             'whole frame. Only with --worker-mode thread.')
+    parser.add_argument('-roi-pad', '--roi-padding', dest='roi_padding',
+                        type=float, default=.5,
+                        help='Padding around the previous hands, relative '
+                             'to the size of their boxes.')
+    parser.add_argument('-roi-full', '--roi-full-frame-interval',
+                        dest='roi_full_frame_interval', type=int, default=10,
+                        help='Number of frames between two full-frame '
+                             'detections in ROI mode, to pick up new hands.')
+    parser.add_argument('-motion-th', '--motion-threshold',
+                        dest='motion_threshold', type=float, default=0,
+                        help='Reuse the previous hand detections while the '
+                             'mean gray level change of the frame stays '
+                             'below this threshold (0 to 255). 0 disables '
+                             'the motion gate. Only with --worker-mode '
+                             'thread.')
+    parser.add_argument('-max-det-age', '--max-detection-age',
+                        dest='max_detection_age', type=int, default=30,
+                        help='Number of frames after which the motion gate '
+                             'refreshes the detections, even on a static '
+                             'frame.')
+    parser.add_argument('-marker-policy', '--marker-policy',
+                        dest='marker_policy', choices=MarkerScheduler.policies,
+                        default=MarkerScheduler.EVERY_NTH,
+                        help='When to detect the markers: on every Nth '
+                             'frame, when the frame changed or at a fixed '
+                             'rate. The other frames reuse the latest '
+                             'markers.')
+    parser.add_argument('-marker-interval', '--marker-interval',
+                        dest='marker_interval', type=int, default=1,
+                        help='Number of frames between two marker '
+                             'detections with the every-nth policy.')
+    parser.add_argument('-marker-rate', '--marker-rate', dest='marker_rate',
+                        type=float, default=5.,
+                        help='Marker detections per second with the rate '
+                             'policy.')
+    parser.add_argument('-marker-motion-th', '--marker-motion-threshold',
+                        dest='marker_motion_threshold', type=float,
+                        default=2.,
+                        help='Mean gray level change (0 to 255) which '
+                             'triggers a marker detection with the '
+                             'on-motion policy.')
+    parser.add_argument('-marker-max-age', '--marker-max-age',
+                        dest='marker_max_age', type=float, default=5.,
+                        help='Time in seconds after which the markers are '
+                             'detected again, regardless of the policy.')
+    parser.add_argument('-marker-scale', '--marker-scale',
+                        dest='marker_scale', type=float, default=None,
+                        help='Look for the markers in a copy of the frame '
+                             'scaled by this factor and refine their corners '
+                             'in the full frame. 1 disables the scaling. By '
+                             'default, the frame is scaled to the display '
+                             'width, so the detection costs about as much as '
+                             'on the displayed frame.')
+    parser.add_argument('-marker-roi', '--marker-roi', dest='marker_roi',
+                        action='store_true',
+                        help='Look for the markers only around the markers '
+                             'found before, instead of in the whole frame.')
+    parser.add_argument('-marker-roi-pad', '--marker-roi-padding',
+                        dest='marker_roi_padding', type=float, default=.5,
+                        help='Padding around the known markers, relative to '
+                             'their size.')
+    parser.add_argument('-marker-full', '--marker-full-scan-interval',
+                        dest='marker_full_scan_interval', type=int,
+                        default=30,
+                        help='Number of marker detections between two scans '
+                             'of the whole frame in marker ROI mode, to pick '
+                             'up new markers.')
+    parser.add_argument('-homography-th', '--homography-threshold',
+                        dest='homography_threshold', type=float, default=1.,
+                        help='Distance in pixels a marker has to move before '
+                             'the homographies of its AOIs are computed '
+                             'again.')
+    parser.add_argument('-aoi-occlusion', '--aoi-max-occlusion',
+                        dest='aoi_max_occlusion', type=int, default=30,
+                        help='Number of frames an AOI is still located with '
+                             'its previous homography while all of its '
+                             'markers are hidden.')
+    parser.add_argument('-batch', '--max-batch-size', dest='max_batch_size',
+                        type=int, default=None,
+                        help='Maximum number of frames the shared detector '
+                             'runs at once. Defaults to the number of '
+                             'workers.')
+    parser.add_argument('-batch-wait', '--max-batch-wait', dest='max_batch_wait',
+                        type=float, default=5,
+                        help='Maximum time in milliseconds the shared '
+                             'detector waits for a batch to fill up.')
+    parser.add_argument('-zmq-format', '--zmq-format', dest='zmq_format',
+                        choices=ZmqPublisher.formats,
+                        default=ZmqPublisher.FRAME,
+                        help='Publish one message per frame and topic with '
+                             'all of its detections, the same in the compact '
+                             'binary format of utils/wire_format.py (hands '
+                             'and markers only), or one message per '
+                             'detection like older versions.')
+    parser.add_argument('-zmq-endpoint', '--zmq-endpoint',
+                        dest='zmq_endpoint',
+                        default=PublisherConfig.DEFAULT_ENDPOINT,
+                        help='Endpoint of the ZMQ publishers, e.g. '
+                             'tcp://127.0.0.1:40002 or ipc:///tmp/hands.')
+    parser.add_argument('-zmq-bind', '--zmq-bind', dest='zmq_bind',
+                        action='store_true',
+                        help='Bind the publishers to the endpoint instead of '
+                             'connecting to it.')
+    parser.add_argument('-zmq-hwm', '--zmq-send-hwm', dest='zmq_send_hwm',
+                        type=int, default=1000,
+                        help='Maximum number of messages queued per '
+                             'subscriber.')
+    parser.add_argument('-zmq-linger', '--zmq-linger', dest='zmq_linger',
+                        type=int, default=None,
+                        help='Time in milliseconds unsent messages are kept '
+                             'after stopping. Defaults to the ZMQ default.')
+    parser.add_argument('-zmq-conflate', '--zmq-conflate',
+                        dest='zmq_conflate', action='store_true',
+                        help='Only keep the latest message of each topic. '
+                             'Topic and payload are sent as one message part, '
+                             'separated by a space.')
+    parser.add_argument('-zmq-io-threads', '--zmq-io-threads',
+                        dest='zmq_io_threads', type=int, default=1,
+                        help='Number of ZMQ I/O threads shared by all '
+                             'publishers.')
+    parser.add_argument('-zmq-coords', '--zmq-coordinates',
+                        dest='zmq_coordinates', default='display',
+                        choices=['display', 'capture'],
+                        help='Coordinate space of the published positions: '
+                             'the --width x --height frame (display, the '
+                             'default, images are never scaled) or the '
+                             'captured frame (capture).')
+    parser.add_argument('-marker-delta', '--marker-delta',
+                        dest='marker_delta', action='store_true',
+                        help='Only publish the markers which appeared, '
+                             'disappeared or moved, with periodic keyframes '
+                             'of all markers. Not suited for --zmq-conflate, '
+                             'which drops messages.')
+    parser.add_argument('-marker-delta-threshold', '--marker-delta-threshold',
+                        dest='marker_delta_threshold', type=float,
+                        default=2.,
+                        help='Distance in pixels a marker corner has to move '
+                             'to publish the marker again.')
+    parser.add_argument('-marker-keyframe-interval',
+                        '--marker-keyframe-interval',
+                        dest='marker_keyframe_interval', type=int,
+                        default=300,
+                        help='Number of frames after which all markers are '
+                             'published again with --marker-delta.')
     parser.add_argument('-q-size', '--queue-size', dest='queue_size', type=int,
                         default=5, help='Size of the queue.')
+    parser.add_argument('-in-flight', '--max-in-flight', dest='max_in_flight',
+                        type=int, default=None,
+                        help='Maximum number of frames being processed at '
+                             'the same time. Defaults to the number of '
+                             'workers.')
+    parser.add_argument('-reorder', '--reorder', dest='reorder',
+                        choices=ReorderBuffer.modes,
+                        default=ReorderBuffer.IN_ORDER,
+                        help='Emit the processed frames in order or drop '
+                             'frames which arrive after a newer one.')
+    parser.add_argument('-reorder-size', '--reorder-buffer-size',
+                        dest='reorder_buffer_size', type=int, default=None,
+                        help='Maximum number of frames held back to restore '
+                             'their order. Defaults to the maximum number of '
+                             'frames in flight.')
     parser.add_argument('-c', '--calibration-file', dest='calibration_file',
                         type=open, default=None,
                         help='Camera calibration file.')
@@ -65,19 +289,65 @@ if __name__ == '__main__':
     if args.video_file is not None and args.image_file is not None:
         raise ValueError("Provide either video or image file, not both.")
 
-    input_q = Queue(maxsize=args.queue_size)
-    output_q = Queue(maxsize=args.queue_size)
+    # The worker processes only see some of the frames, in no particular
+    # order, so strategies which carry state from frame to frame don't work
+    # there.
+    if args.worker_mode == 'process' and args.detection_interval > 1:
+        raise ValueError("Tracking hands between detections "
+                         "(--detection-interval) needs consecutive frames, "
+                         "which the worker processes don't get. Use "
+                         "--worker-mode thread.")
+
+    if args.worker_mode == 'process' and args.motion_threshold > 0:
+        raise ValueError("The motion gate (--motion-threshold) compares "
+                         "consecutive frames, which the worker processes "
+                         "don't get. Use --worker-mode thread.")
+
+    if args.worker_mode == 'process' and args.roi:
+        raise ValueError("ROI mode (--roi) predicts the crops from the "
+                         "previous frame, which the worker processes don't "
+                         "get. Use --worker-mode thread.")
+
+    if args.max_in_flight is None:
+        args.max_in_flight = args.num_workers
+
+    if args.hand_workers is None:
+        args.hand_workers = args.num_workers
+
+    if args.marker_workers is None:
+        args.marker_workers = args.num_workers
+
+    if args.max_batch_size is None:
+        args.max_batch_size = args.hand_workers
+
+    if args.reorder_buffer_size is None:
+        args.reorder_buffer_size = args.max_in_flight
+
+    # The queues have to be able to hold every frame in flight, otherwise the
+    # driver and the workers could block each other.
+    queue_size = max(args.queue_size, args.max_in_flight)
+    input_q = Queue(maxsize=queue_size)
+    output_q = Queue(maxsize=queue_size)
 
     # No max size here, because this would limit the amount of hand/markers
     # we're able to detect per frame
     center_points_q = Queue()
     marker_q = Queue()
+    aoi_q = Queue()
 
     cap_params = {}
 
+    publisher_config = PublisherConfig(args.zmq_endpoint, args.zmq_bind,
+                                       args.zmq_send_hwm, args.zmq_linger,
+                                       args.zmq_conflate, args.zmq_io_threads)
+
     zmq_publishers = [
-        HandPositionPublisher(center_points_q),
-        MarkerPublisher(marker_q)
+        HandPositionPublisher(center_points_q, args.zmq_format,
+                              publisher_config),
+        MarkerPublisher(marker_q, args.zmq_format, publisher_config,
+                        args.marker_delta, args.marker_delta_threshold,
+                        args.marker_keyframe_interval),
+        AoiPublisher(aoi_q, args.zmq_format, publisher_config)
     ]
 
     for publisher in zmq_publishers:
@@ -88,57 +358,129 @@ if __name__ == '__main__':
     # max number of hands we want to detect/track
     cap_params['num_hands_detect'] = args.num_hands
 
+    cap_params['tile_layouts'] = args.tile_layouts
+    cap_params['tile_overlap'] = args.tile_overlap
+    cap_params['roi'] = args.roi
+    cap_params['roi_padding'] = args.roi_padding
+    cap_params['roi_full_frame_interval'] = args.roi_full_frame_interval
+    cap_params['detection_interval'] = args.detection_interval
+    cap_params['min_tracking_confidence'] = args.min_tracking_confidence
+    cap_params['motion_threshold'] = args.motion_threshold
+    cap_params['max_detection_age'] = args.max_detection_age
+    cap_params['marker_policy'] = args.marker_policy
+    cap_params['marker_interval'] = args.marker_interval
+    cap_params['marker_rate'] = args.marker_rate
+    cap_params['marker_motion_threshold'] = args.marker_motion_threshold
+    cap_params['marker_max_age'] = args.marker_max_age
+    cap_params['marker_roi'] = args.marker_roi
+    cap_params['marker_roi_padding'] = args.marker_roi_padding
+    cap_params['marker_full_scan_interval'] = args.marker_full_scan_interval
+    cap_params['homography_threshold'] = args.homography_threshold
+    cap_params['aoi_max_occlusion'] = args.aoi_max_occlusion
+
     def next_image(): return
 
     def cleanup(): return
 
     if args.image_file is not None:
         image_file = cv2.imread(args.image_file.name)
-        cap_params['im_width'] = image_file.shape[0]
-        cap_params['im_height'] = image_file.shape[1]
+        cap_params['im_width'] = image_file.shape[1]
+        cap_params['im_height'] = image_file.shape[0]
 
-        def next_image(): return copy.deepcopy(image_file)
+        def next_image():
+            return copy.deepcopy(image_file), time.time(), time.monotonic()
     elif args.video_file is not None:
         # If it's a video file, we want the system to take all the time it
         # needs to process every single frame. Thus, the frame from the file
         # are queued and processed one after another. To guarantee that the
         # output is fluid when using a web cam, only the currently captured
         # frame is processed.
-        video_capture = WebcamVideoStream(args.video_file.name, args.width,
-                                          args.height, queued=True)\
+        video_capture = WebcamVideoStream(args.video_file.name, queued=True)\
             .start()
 
-        cap_params['im_width'] = args.width
-        cap_params['im_height'] = args.height
+        cap_params['im_width'], cap_params['im_height'] = \
+            (int(length) for length in video_capture.size())
 
-        def next_image(): return video_capture.read()
+        def next_image(): return video_capture.read_stamped()
 
         def cleanup(): return video_capture.stop()
     else:
-        video_capture = WebcamVideoStream(args.video_source, args.width,
-                                          args.height)\
-            .start()
+        video_capture = WebcamVideoStream(args.video_source).start()
 
-        cap_params['im_width'] = args.width
-        cap_params['im_height'] = args.height
+        cap_params['im_width'], cap_params['im_height'] = \
+            (int(length) for length in video_capture.size())
 
-        def next_image(): return cv2.flip(video_capture.read(), 1)
+        def next_image():
+            frame, timestamp, monotonic_time = video_capture.read_stamped()
+            return cv2.flip(frame, 1), timestamp, monotonic_time
 
         def cleanup(): return video_capture.stop()
 
+    if args.marker_scale is not None:
+        cap_params['marker_scale'] = args.marker_scale
+    else:
+        cap_params['marker_scale'] = min(1., args.width /
+                                         cap_params['im_width'])
+
     if args.calibration_file is not None:
         calibration = Calibration(args.calibration_file)
     else:
         calibration = None
 
     latest_markers: SynchronizedVariable[List[Dict]] = SynchronizedVariable([])
+    aois: SynchronizedVariable[List[Aoi]] = SynchronizedVariable([])
+
+    detector_config = {
+        'backend': args.backend,
+        'model_path': args.model_path,
+        'num_threads': args.backend_threads,
+        'use_xnnpack': args.use_xnnpack
+    }
 
-    for i in range(args.num_workers):
-        Thread(target=lambda *args: Worker(*args).run(), daemon=True,
-               args=(input_q, output_q, marker_q, center_points_q,
-                     cap_params, latest_markers, calibration))\
+    def stop_workers(): return
+
+    def print_stats(): return
+
+    def rescan_markers(): return
+
+    if args.worker_mode == 'process':
+        frame_shape = (cap_params['im_height'], cap_params['im_width'], 3)
+
+        worker_pool = ProcessWorkerPool(input_q, output_q, args.num_workers,
+                                        frame_shape, args.max_in_flight,
+                                        cap_params, detector_config,
+                                        latest_markers, calibration, aois)\
             .start()
 
+        def stop_workers(): return worker_pool.stop()
+
+        def print_stats():
+            for stats in worker_pool.stats():
+                print(stats)
+
+        def rescan_markers(): return worker_pool.rescan_markers()
+    else:
+        # All workers share a single graph and session, which batches the
+        # frames of the workers.
+        detector = DetectorService(create_detector(**detector_config),
+                                   args.max_batch_size,
+                                   args.max_batch_wait / 1000)
+        detector.start()
+
+        # Created once, so strategies like tracking see the frames of all
+        # workers.
+        hand_detector = create_hand_detector(detector, cap_params)
+
+        worker = Worker(input_q, output_q, cap_params, hand_detector,
+                        latest_markers, calibration, args.hand_workers,
+                        args.marker_workers, aois).start()
+
+        def print_stats():
+            for stats in worker.stats:
+                print(stats)
+
+        def rescan_markers(): return worker.rescan_markers()
+
     window = OpenCVWindow('Multi-Threaded Detection')
     window.create()
 
@@ -150,21 +492,42 @@ if __name__ == '__main__':
         print("Cleaning up...")
         cleanup()
 
+        # The worker processes have to be alive to report their statistics.
+        print_stats()
+        print("Stopping workers...")
+        stop_workers()
+
         print("Closing OpenCV windows...")
         window.destroy()
 
     cli_input = CommandLineInput()
     cli_input.start_capture()
 
-    InitialState.init_args = (next_image, window)
-    DefineAoi.init_args = (latest_markers,)
+    InitialState.init_args = (next_image, window,
+                              FrameRenderer(cap_params, calibration),
+                              (args.width, args.height), rescan_markers)
+    DefineAoi.init_args = (latest_markers, aois)
     DefineAoi.initial_state = DefineAoiMarkerSelectionState
     DefineAoiNameState.init_args = (cli_input,)
     DefineAoiMarkerSelectionState.init_args = (window, cli_input)
     DefineAoiDrawState.init_args = (window, cli_input)
     ExititingState.init_args = (cleanup_,)
 
-    state_machine = StateMachine(window, cli_input, input_q, output_q, args.fps,
+    # The frames are processed at capture resolution, but the subscribers
+    # expect the positions in the frame the detection used to run on: the
+    # display size for cameras and videos, the image itself for images.
+    publish_scale = None
+    if args.zmq_coordinates == 'display' and args.image_file is None:
+        publish_scale = (args.width / cap_params['im_width'],
+                         args.height / cap_params['im_height'])
+
+    pipeline = FramePipeline(input_q, output_q, args.max_in_flight,
+                             ReorderBuffer(args.reorder,
+                                           args.reorder_buffer_size),
+                             center_points_q, marker_q, aoi_q,
+                             publish_scale)
+
+    state_machine = StateMachine(window, cli_input, pipeline, args.fps,
                                  args.display)
 
     state_machine.enter_state(InitialState)
@@ -1,11 +1,10 @@
 from utils import detector_utils as detector_utils
+from utils.detector_backends import BACKENDS, create_detector
+from utils.preprocessing import to_model_input
 import cv2
-import tensorflow as tf
 import datetime
 import argparse
 
-detection_graph, sess = detector_utils.load_inference_graph()
-
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -64,8 +63,37 @@ if __name__ == '__main__':
         type=int,
         default=5,
         help='Size of the queue.')
+    parser.add_argument(
+        '-b',
+        '--backend',
+        dest='backend',
+        choices=BACKENDS,
+        default='tf',
+        help='Runtime used to run the hand detector.')
+    parser.add_argument(
+        '-m',
+        '--model',
+        dest='model_path',
+        default=None,
+        help='Path to the model file for the selected backend.')
+    parser.add_argument(
+        '-b-threads',
+        '--backend-threads',
+        dest='backend_threads',
+        type=int,
+        default=None,
+        help='Number of threads the detector backend may use.')
+    parser.add_argument(
+        '-no-xnnpack',
+        '--no-xnnpack',
+        dest='use_xnnpack',
+        action='store_false',
+        help='Disable the XNNPACK delegate of the TFLite backend.')
     args = parser.parse_args()
 
+    detector = create_detector(args.backend, args.model_path,
+                               args.backend_threads, args.use_xnnpack)
+
     cap = cv2.VideoCapture(args.video_source)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
@@ -82,17 +110,14 @@ if __name__ == '__main__':
         # Expand dimensions since the model expects images to have shape: [1, None, None, 3]
         ret, image_np = cap.read()
         # image_np = cv2.flip(image_np, 1)
-        try:
-            image_np = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
-        except:
-            print("Error converting to RGB")
 
         # Actual detection. Variable boxes contains the bounding box cordinates for hands detected,
         # while scores contains the confidence for each of these boxes.
         # Hint: If len(boxes) > 1 , you may assume you have found atleast one hand (within your score threshold)
 
-        boxes, scores = detector_utils.detect_objects(image_np,
-                                                      detection_graph, sess)
+        # The model input is scaled and converted to RGB in one pass, the
+        # captured BGR frame is only used for drawing.
+        boxes, scores = detector.detect(to_model_input(image_np))
 
         # draw bounding boxes on frame
         detector_utils.draw_box_on_image(num_hands_detect, args.score_thresh,
@@ -110,8 +135,7 @@ if __name__ == '__main__':
                 detector_utils.draw_fps_on_image("FPS : " + str(int(fps)),
                                                  image_np)
 
-            cv2.imshow('Single-Threaded Detection',
-                       cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR))
+            cv2.imshow('Single-Threaded Detection', image_np)
 
             if cv2.waitKey(25) & 0xFF == ord('q'):
                 cv2.destroyAllWindows()
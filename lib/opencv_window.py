@@ -6,6 +6,9 @@ from typing import Callable
 class OpenCVWindow:
     def __init__(self, name):
         self.name = name
+        # Scale from the shown frame to the source frame, so click handlers
+        # get coordinates of the source frame.
+        self._scale = (1., 1.)
 
     def _dummy_click_handler(self, *args):
         pass
@@ -17,12 +20,24 @@ class OpenCVWindow:
         self.set_click_handler(self._dummy_click_handler)
 
     def set_click_handler(self, handler: Callable):
-        cv2.setMouseCallback(self.name, handler)
+        def scaled_handler(event, x, y, flags, param):
+            scale_x, scale_y = self._scale
+            handler(event, int(x * scale_x), int(y * scale_y), flags, param)
+
+        cv2.setMouseCallback(self.name, scaled_handler)
 
     def get_pressed_key(self):
         return chr(cv2.waitKey(1) & 0xFF)
 
-    def show_frame(self, frame):
+    def show_frame(self, frame, source_size=None):
+        """Shows the frame. If it was scaled from a frame of `source_size`
+        (width, height), clicks are mapped back to that frame."""
+        if source_size is None:
+            self._scale = (1., 1.)
+        else:
+            self._scale = (source_size[0] / frame.shape[1],
+                           source_size[1] / frame.shape[0])
+
         cv2.imshow(self.name, frame)
 
     def destroy(self):
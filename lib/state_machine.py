@@ -1,7 +1,6 @@
 import datetime
 
 from typing import Type
-from queue import Queue
 
 import lib.commandable_state_machine as cmd_state_machine
 import state_implementations as states
@@ -9,11 +8,12 @@ import state_implementations as states
 from lib.vsm import VSM
 from lib.command_line_input import CommandLineInput
 from lib.opencv_window import OpenCVWindow
+from utils.frame_pipeline import FramePipeline
 
 
 class StateMachine(cmd_state_machine.CommandableStateMachine):
     def __init__(self, window: OpenCVWindow, cli_input: CommandLineInput,
-                 input_queue: Queue, output_queue: Queue, draw_fps=False,
+                 pipeline: FramePipeline, draw_fps=False,
                  display_output=False):
         super().__init__()
 
@@ -26,8 +26,9 @@ class StateMachine(cmd_state_machine.CommandableStateMachine):
         self._start_time = datetime.datetime.now()
         self._num_frames = 0
 
-        self.input_queue = input_queue
-        self.output_queue = output_queue
+        self.pipeline = pipeline
+        self.input_queue = pipeline.input_q
+        self.output_queue = pipeline.output_q
         self.display_output = display_output
         self.draw_fps = draw_fps
 
@@ -0,0 +1,250 @@
+# Exports one of the checkpoints in `model-checkpoint` as a TFLite model and
+# quantizes it to int8 with a representative set of calibration frames.
+#
+# Requires TensorFlow 1.15 and the TensorFlow Object Detection API (for
+# `export_tflite_ssd_graph_lib`). The quantized model is written as a
+# versioned artifact next to a JSON file with its metrics and can be used
+# with `--backend tflite --model <path>`. The models are evaluated with
+# `tflite_runtime` if it is installed, and with `tf.lite` otherwise; the
+# latter ignores `--backend-threads`, which needs TensorFlow 2.3.
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from utils.benchmark_utils import latency_report, load_frames
+from utils.box_utils import box_iou
+from utils.detector_backends import TFLiteBackend, DEFAULT_INPUT_SIZE
+
+INPUT_ARRAY = 'normalized_input_image_tensor'
+OUTPUT_ARRAYS = ['TFLite_Detection_PostProcess',
+                 'TFLite_Detection_PostProcess:1',
+                 'TFLite_Detection_PostProcess:2',
+                 'TFLite_Detection_PostProcess:3']
+
+
+def find_checkpoint(checkpoint_dir):
+    configs = glob.glob(os.path.join(checkpoint_dir, '*.config'))
+    if len(configs) != 1:
+        raise ValueError("Expected exactly one *.config file in {}, found {}."
+                         .format(checkpoint_dir, configs))
+
+    checkpoint_prefix = tf.train.latest_checkpoint(checkpoint_dir)
+    if checkpoint_prefix is None:
+        indices = glob.glob(os.path.join(checkpoint_dir, '*.index'))
+        if not indices:
+            raise ValueError("No checkpoint found in {}."
+                             .format(checkpoint_dir))
+        checkpoint_prefix = indices[0][:-len('.index')]
+
+    return configs[0], checkpoint_prefix
+
+
+def export_tflite_graph(config_path, checkpoint_prefix, output_dir,
+                        max_detections):
+    from google.protobuf import text_format
+    from object_detection import export_tflite_ssd_graph_lib
+    from object_detection.protos import pipeline_pb2
+
+    pipeline_config = pipeline_pb2.TrainEvalPipelineConfig()
+    with tf.gfile.GFile(config_path, 'r') as f:
+        text_format.Merge(f.read(), pipeline_config)
+
+    export_tflite_ssd_graph_lib.export_tflite_graph(
+        pipeline_config, checkpoint_prefix, output_dir,
+        add_postprocessing_op=True, max_detections=max_detections,
+        max_classes_per_detection=1)
+
+    return os.path.join(output_dir, 'tflite_graph.pb')
+
+
+def convert(graph_path, input_size, calibration_frames=None):
+    width, height = input_size
+    converter = tf.lite.TFLiteConverter.from_frozen_graph(
+        graph_path, [INPUT_ARRAY], OUTPUT_ARRAYS,
+        input_shapes={INPUT_ARRAY: [1, height, width, 3]})
+    converter.allow_custom_ops = True
+
+    if calibration_frames is not None:
+        def representative_dataset():
+            for frame in calibration_frames:
+                yield [(frame[np.newaxis].astype(np.float32) / 127.5) - 1.]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+
+    return converter.convert()
+
+
+def next_versioned_path(output_dir, name):
+    version = 1
+    while os.path.exists(os.path.join(output_dir, '{}_int8_v{}.tflite'
+                                      .format(name, version))):
+        version += 1
+
+    return os.path.join(output_dir, '{}_int8_v{}.tflite'.format(name, version))
+
+
+def benchmark(detector, frames, score_thresh, num_hands):
+    latencies, detections = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        boxes, scores = detector.detect(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        keep = scores[:num_hands] > score_thresh
+        detections.append(boxes[:num_hands][keep])
+
+    return np.array(latencies), detections
+
+
+def box_agreement(reference, candidate, iou_thresh):
+    """Matches every reference box with the best overlapping candidate box of
+    the same frame."""
+    matched, missed, extra, ious = 0, 0, 0, []
+    for reference_boxes, candidate_boxes in zip(reference, candidate):
+        iou = box_iou(reference_boxes, candidate_boxes)
+        used = set()
+        for row in iou:
+            best = int(np.argmax(row)) if len(row) else -1
+            if best >= 0 and best not in used and row[best] >= iou_thresh:
+                used.add(best)
+                matched += 1
+                ious.append(float(row[best]))
+            else:
+                missed += 1
+        extra += len(candidate_boxes) - len(used)
+
+    total = matched + missed
+    return {
+        'matched_boxes': matched,
+        'missed_boxes': missed,
+        'extra_boxes': extra,
+        'recall': matched / total if total else 1.,
+        'mean_iou': float(np.mean(ious)) if ious else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-ckpt', '--checkpoint-dir', dest='checkpoint_dir',
+                        default='model-checkpoint/ssdlitemobilenetv2',
+                        help='Directory with the checkpoint and the pipeline '
+                             'config of the model to quantize.')
+    parser.add_argument('-frames', '--frames', dest='frames', required=True,
+                        help='Directory of images or a video file with '
+                             'frames from the target camera.')
+    parser.add_argument('-n-calib', '--num-calibration-frames',
+                        dest='num_calibration_frames', type=int, default=100,
+                        help='Number of frames used to calibrate the '
+                             'quantization. The remaining frames are used '
+                             'for the evaluation.')
+    parser.add_argument('-o', '--output-dir', dest='output_dir',
+                        default='hand_inference_graph',
+                        help='Directory the quantized model is written to.')
+    parser.add_argument('-name', '--name', dest='name',
+                        default='hand_detector',
+                        help='Base name of the quantized model.')
+    parser.add_argument('-max-det', '--max-detections', dest='max_detections',
+                        type=int, default=10,
+                        help='Maximum number of detections of the exported '
+                             'model.')
+    parser.add_argument('-sth', '--scorethreshold', dest='score_thresh',
+                        type=float, default=0.2,
+                        help='Score threshold for the compared boxes.')
+    parser.add_argument('-nhands', '--num_hands', dest='num_hands', type=int,
+                        default=2, help='Max number of compared hands.')
+    parser.add_argument('-iou', '--iou-threshold', dest='iou_thresh',
+                        type=float, default=0.5,
+                        help='Minimum IoU for two boxes to agree.')
+    parser.add_argument('-b-threads', '--backend-threads',
+                        dest='backend_threads', type=int, default=None,
+                        help='Number of threads used for the latency '
+                             'measurement. Needs tflite_runtime, TensorFlow '
+                             '1.15 uses its default.')
+    args = parser.parse_args()
+
+    # RGB frames at the model's input size.
+    frames = [cv2.cvtColor(cv2.resize(frame, DEFAULT_INPUT_SIZE),
+                           cv2.COLOR_BGR2RGB)
+              for frame in load_frames(args.frames)]
+    if not frames:
+        raise ValueError("No frames found in {}.".format(args.frames))
+
+    # Measured on the calibration frames, the agreement of the int8 model
+    # would look better than it is.
+    if len(frames) <= args.num_calibration_frames:
+        raise ValueError("Only {} frames found in {}, more than the {} "
+                         "calibration frames are needed to evaluate the "
+                         "model.".format(len(frames), args.frames,
+                                         args.num_calibration_frames))
+
+    calibration_frames = frames[:args.num_calibration_frames]
+    evaluation_frames = frames[args.num_calibration_frames:]
+
+    config_path, checkpoint_prefix = find_checkpoint(args.checkpoint_dir)
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        print("Exporting {}...".format(checkpoint_prefix))
+        graph_path = export_tflite_graph(config_path, checkpoint_prefix,
+                                         work_dir, args.max_detections)
+
+        print("Converting fp32 reference model...")
+        fp32_path = os.path.join(work_dir, 'fp32.tflite')
+        with open(fp32_path, 'wb') as f:
+            f.write(convert(graph_path, DEFAULT_INPUT_SIZE))
+
+        print("Quantizing with {} calibration frames..."
+              .format(len(calibration_frames)))
+        os.makedirs(args.output_dir, exist_ok=True)
+        int8_path = next_versioned_path(args.output_dir, args.name)
+        with open(int8_path, 'wb') as f:
+            f.write(convert(graph_path, DEFAULT_INPUT_SIZE,
+                            calibration_frames))
+
+        print("Evaluating on {} frames...".format(len(evaluation_frames)))
+        fp32_latencies, fp32_boxes = benchmark(
+            TFLiteBackend(fp32_path, args.backend_threads), evaluation_frames,
+            args.score_thresh, args.num_hands)
+        int8_latencies, int8_boxes = benchmark(
+            TFLiteBackend(int8_path, args.backend_threads), evaluation_frames,
+            args.score_thresh, args.num_hands)
+
+        report = {
+            'source_checkpoint': checkpoint_prefix,
+            'created': datetime.datetime.now().isoformat(),
+            'calibration_frames': len(calibration_frames),
+            'evaluation_frames': len(evaluation_frames),
+            'size_bytes': {
+                'fp32': os.path.getsize(fp32_path),
+                'int8': os.path.getsize(int8_path),
+            },
+            'latency': {
+                'fp32': latency_report(fp32_latencies),
+                'int8': latency_report(int8_latencies),
+            },
+            'box_agreement': box_agreement(fp32_boxes, int8_boxes,
+                                           args.iou_thresh),
+        }
+    finally:
+        shutil.rmtree(work_dir)
+
+    with open(os.path.splitext(int8_path)[0] + '.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print("Wrote {}, use it with `--backend tflite --model {}`."
+          .format(int8_path, int8_path))
@@ -6,9 +6,9 @@ import lib.commandable_state_machine as cmd_state_machine
 import state_implementations as states
 
 from lib import InvalidTransitionError
-from lib.vsm import VSM
 from lib.opencv_window import OpenCVWindow
 from lib.command_line_input import CommandLineInput
+from utils.aoi import Aoi
 from .define_aoi_state import DefineAoi
 
 
@@ -18,11 +18,14 @@ class DefineAoiDrawState(cmd_state_machine.CommandableStateMachine):
         self.window = window
         self.cli = cli
         self.selected_points: List[Tuple[int, int]] = []
+        self.define_aoi_state: DefineAoi
 
-    def enter(self, parent_state: VSM):
-        if parent_state.current_state not in [states.DefineAoiMarkerSelectionState, states.DefineAoiNameState]:
+    def enter(self, parent_state: DefineAoi):
+        if type(parent_state.current_state) not in [states.DefineAoiMarkerSelectionState, states.DefineAoiNameState]:
             raise InvalidTransitionError(type(parent_state.current_state), type(self))
 
+        self.define_aoi_state = parent_state
+
         self.help_text = ("Use the left mouse button to draw an AOI into "
                           "the window.")
 
@@ -30,7 +33,7 @@ class DefineAoiDrawState(cmd_state_machine.CommandableStateMachine):
             key='d',
             description='Save the current AOI and continue to the next '
                         'step.',
-            action=lambda: states.DefineAoiNameState
+            action=self.save_aoi
         )
 
         self._register_command(
@@ -43,6 +46,27 @@ class DefineAoiDrawState(cmd_state_machine.CommandableStateMachine):
 
         # TODO After AOI is drawn, get into NAME_AOI state
 
+    def save_aoi(self):
+        if len(self.selected_points) < 3:
+            self.cli.print_continuous("An AOI needs at least 3 points.")
+            return
+
+        # The markers as they are seen now are the reference for locating the
+        # AOI in later frames.
+        aoi = Aoi(self.define_aoi_state.name,
+                  self.define_aoi_state.selected_markers,
+                  self.selected_points,
+                  {marker['id']: marker['corners']
+                   for marker in self.define_aoi_state.visible_markers.value})
+
+        aois = self.define_aoi_state.aois
+        with aois.lock:
+            aois.value = aois.value + [aoi]
+
+        print("Saved {}.".format(aoi))
+
+        return states.InitialState
+
     def add_point(self, event, x, y, flags, param):
         if event != cv2.EVENT_LBUTTONDOWN:
             return
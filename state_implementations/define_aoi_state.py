@@ -3,14 +3,17 @@ from typing import List, Dict
 import lib.commandable_state_machine as cmd_state_machine
 import state_implementations as states
 
+from utils.aoi import Aoi
 from utils.synchronized_variable import SynchronizedVariable
 
 
 class DefineAoi(cmd_state_machine.CommandableStateMachine):
-    def __init__(self, markers: SynchronizedVariable[List[Dict]]):
+    def __init__(self, markers: SynchronizedVariable[List[Dict]],
+                 aois: SynchronizedVariable[List[Aoi]]):
         super().__init__()
         self.name = ""
         self.visible_markers = markers
+        self.aois = aois
         self.selected_markers = set()
 
     def enter(self, sm):
@@ -18,4 +18,8 @@ class ExititingState(vsm.VSM):
         fps, _ = sm._get_fps()
         print("FPS:", fps)
 
+        reorder_buffer = sm.pipeline.reorder_buffer
+        print("Reordered frames: {}, dropped frames: {}"
+              .format(reorder_buffer.reordered, reorder_buffer.dropped))
+
         self.cleanup()
@@ -1,7 +1,6 @@
-import cv2
 import datetime
 
-from typing import Callable
+from typing import Callable, Tuple
 
 import lib.state_machine as stt_mhn
 import lib.commandable_state_machine as cmd_state_machine
@@ -9,14 +8,21 @@ import utils.detector_utils as detector_utils
 import state_implementations as states
 
 from lib.opencv_window import OpenCVWindow
+from utils.frame_renderer import FrameRenderer
 
 
 class InitialState(cmd_state_machine.CommandableStateMachine):
-    def __init__(self, next_image: Callable, window: OpenCVWindow):
+    def __init__(self, next_image: Callable, window: OpenCVWindow,
+                 renderer: FrameRenderer,
+                 display_size: Tuple[int, int] = None,
+                 rescan_markers: Callable = None):
         super().__init__()
 
         self.window = window
         self.next_image = next_image
+        self.renderer = renderer
+        self.display_size = display_size
+        self.rescan_markers = rescan_markers
 
         self._start_time = datetime.datetime.now()
         self._num_frames = 0
@@ -45,28 +51,46 @@ class InitialState(cmd_state_machine.CommandableStateMachine):
             action=lambda: states.DefineAoi
         )
 
+        if self.rescan_markers is not None:
+            self._register_command(
+                key='m',
+                description="Detect the markers again on the next frame.",
+                action=lambda: self.rescan_markers()
+            )
+
     def run(self, parent_state):
-        frame = self.next_image()
-        self._num_frames += 1
+        pipeline = parent_state.pipeline
 
-        parent_state.input_queue.put(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        # Keep the workers busy: submit new frames until the pipeline is at
+        # capacity, then wait for whichever result comes back first.
+        while not pipeline.is_full:
+            # The frame stays BGR at capture resolution, the workers scale
+            # and convert only what the model needs. It comes with the time
+            # it was captured at.
+            frame, timestamp, monotonic_time = self.next_image()
+            pipeline.submit(frame, timestamp, monotonic_time)
 
-        output_frame = parent_state.output_queue.get()
+        result = pipeline.get()
 
         # TODO Log queue length
 
-        if output_frame is None:
+        if result is None:
             print("Received empty output frame, exiting...")
             return states.ExititingState
 
-        output_frame = cv2.cvtColor(output_frame, cv2.COLOR_RGB2BGR)
+        self._num_frames += 1
+        parent_state._num_frames += 1
 
         fps, elapsed_time = parent_state._get_fps()
 
         if parent_state.display_output:
+            # Only displayed frames are drawn on, at display resolution.
+            output_frame = self.renderer.render(result, self.display_size)
             if parent_state.draw_fps:
                 detector_utils.draw_fps_on_image(fps, output_frame)
-            self.window.show_frame(output_frame)
+
+            height, width = result.image.shape[:2]
+            self.window.show_frame(output_frame, (width, height))
         else:
             print("frames processed: {}, elapsed time: {}, fps: {}"
                   .format(self._num_frames, elapsed_time, fps))
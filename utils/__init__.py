@@ -1,2 +1,12 @@
-from .worker import Worker
 from .calibration import Calibration
+
+
+def __getattr__(name):
+    # The worker pulls in TensorFlow, so it is only imported when it is
+    # used. Modules like `wire_format` can then be used without it.
+    if name == 'Worker':
+        from .worker import Worker
+        return Worker
+
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))
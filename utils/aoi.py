@@ -0,0 +1,29 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class Aoi:
+    """An area of interest on the table, defined relative to a set of
+    markers.
+
+    `polygon` holds the pixel coordinates of the area and
+    `reference_corners` the corners of the markers (by id) in the frame the
+    area was drawn on. They are the reference for locating the area in later
+    frames."""
+
+    def __init__(self, name: str, marker_ids: Iterable[int],
+                 polygon: List[Tuple[int, int]],
+                 reference_corners: Dict[int, np.ndarray]):
+        self.name = name
+        self.marker_ids = sorted(int(marker_id) for marker_id in marker_ids)
+        self.polygon = np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        self.reference_corners = {
+            int(marker_id): np.asarray(corners, dtype=np.float32)
+            .reshape(4, 2)
+            for marker_id, corners in reference_corners.items()
+            if int(marker_id) in self.marker_ids
+        }
+
+    def __repr__(self):
+        return "Aoi({!r}, markers={})".format(self.name, self.marker_ids)
@@ -0,0 +1,136 @@
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+import shapely
+
+from shapely.strtree import STRtree
+
+from .aoi import Aoi
+from .calibration import Calibration
+from .frame import Frame
+from .homography_cache import HomographyCache
+from .pose_estimator import PoseEstimator
+from .synchronized_variable import SynchronizedVariable
+
+
+class _Mapping:
+    def __init__(self, aois: List[Aoi], homographies: List[np.ndarray],
+                 polygons: Dict[str, np.ndarray], tree: STRtree = None):
+        self.aois = aois
+        self.homographies = homographies
+        self.polygons = polygons
+        self.tree = tree
+
+
+class AoiEngine:
+    """Locates the AOIs in a frame and tells which hands are inside of them.
+
+    Every AOI polygon is mapped into the frame through the homography from
+    the reference corners of its markers to their current corners. The
+    mapped polygons are put into an STRtree, which is queried with all hand
+    center points at once, so the cost hardly grows with the number of AOIs
+    and hands. The homographies are cached as long as the markers don't
+    move, see `HomographyCache`, and the polygons and the tree are only
+    built again when one of them changed. With a calibration, the poses of
+    the AOIs are estimated as well."""
+
+    def __init__(self, aois: SynchronizedVariable[List[Aoi]],
+                 calibration: Calibration = None, homography_threshold=1.,
+                 max_occlusion=30):
+        self.aois = aois
+        self.homographies = HomographyCache(homography_threshold,
+                                            max_occlusion)
+        self.pose_estimator = PoseEstimator(calibration) \
+            if calibration is not None else None
+
+        # The AOIs and homographies the polygons and the tree were built
+        # from, replaced at once, since the workers share the engine.
+        self._mapping = _Mapping([], [], {}, None)
+
+    @property
+    def stats(self):
+        return self.homographies.stats
+
+    def _map_polygons(self, aois: List[Aoi], frame: Frame) -> '_Mapping':
+        corners_by_id = {}
+        if frame.marker_ids is not None:
+            ids = frame.marker_ids.ravel().tolist()
+            corners_by_id = {
+                marker_id: corners.reshape(4, 2)
+                for marker_id, corners in zip(ids, frame.marker_corners)
+            }
+
+        homographies = [self.homographies.get(aoi, corners_by_id, frame.seq)
+                        for aoi in aois]
+
+        # The cache returns the same homography as long as it is valid.
+        mapping = self._mapping
+        if len(aois) == len(mapping.aois) and \
+                all(aoi is mapped_aoi for aoi, mapped_aoi
+                    in zip(aois, mapping.aois)) and \
+                all(homography is mapped_homography
+                    for homography, mapped_homography
+                    in zip(homographies, mapping.homographies)):
+            return mapping
+
+        polygons = {}
+        for aoi, homography in zip(aois, homographies):
+            if homography is None:
+                continue
+
+            polygons[aoi.name] = cv2.perspectiveTransform(
+                aoi.polygon.reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+        tree = STRtree(shapely.polygons(list(polygons.values()))) \
+            if polygons else None
+
+        mapping = _Mapping(aois, homographies, polygons, tree)
+        self._mapping = mapping
+
+        return mapping
+
+    @staticmethod
+    def _classify_hands(mapping: '_Mapping',
+                        center_points: List[Dict]) -> List[Dict]:
+        if mapping.tree is None or not center_points:
+            return []
+
+        names = list(mapping.polygons)
+        points = shapely.points([center_point['palm_position']
+                                 for center_point in center_points])
+
+        hand_indices, aoi_indices = mapping.tree.query(points,
+                                                       predicate='within')
+
+        return [{
+            'aoi': names[aoi_index],
+            'hand': int(hand_index),
+            'palm_position': center_points[hand_index]['palm_position'],
+            'confidence': center_points[hand_index]['confidence'],
+        } for hand_index, aoi_index in zip(hand_indices, aoi_indices)]
+
+    def process(self, frame: Frame):
+        aois = self.aois.value
+        if not aois:
+            return
+
+        mapping = self._map_polygons(aois, frame)
+        frame.aoi_polygons = mapping.polygons
+        frame.hands_in_aois = self._classify_hands(mapping,
+                                                   frame.center_points)
+
+        if self.pose_estimator is None or frame.undistorted_corners is None:
+            return
+
+        frame.aoi_names, frame.aoi_rotation_vecs, \
+            frame.aoi_translation_vecs = self.pose_estimator.aoi_poses(
+                frame.undistorted_corners, frame.marker_ids, aois)
+
+
+def create_aoi_engine(aois: SynchronizedVariable[List[Aoi]],
+                      calibration: Calibration,
+                      cap_params: Dict[str, Any]) -> AoiEngine:
+    return AoiEngine(aois, calibration,
+                     cap_params.get('homography_threshold', 1.),
+                     cap_params.get('aoi_max_occlusion', 30))
@@ -0,0 +1,42 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+
+
+def load_frames(source, max_frames=None):
+    """Loads the BGR frames of a directory of images or a video file."""
+    if os.path.isdir(source):
+        paths = sorted(path for path in glob.glob(os.path.join(source, '*'))
+                       if path.lower().endswith(('.jpg', '.jpeg', '.png')))
+        images = (cv2.imread(path) for path in paths)
+    else:
+        capture = cv2.VideoCapture(source)
+
+        def read_video():
+            while True:
+                grabbed, image = capture.read()
+                if not grabbed:
+                    return
+                yield image
+
+        images = read_video()
+
+    frames = []
+    for image in images:
+        if image is None:
+            continue
+        frames.append(image)
+        if max_frames is not None and len(frames) >= max_frames:
+            break
+
+    return frames
+
+
+def latency_report(latencies):
+    return {
+        'mean_ms': float(np.mean(latencies)),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+    }
@@ -0,0 +1,95 @@
+# Vectorized helpers for normalized (ymin, xmin, ymax, xmax) boxes.
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+def box_areas(boxes: np.ndarray) -> np.ndarray:
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * \
+        np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Returns the pairwise intersection over union of two sets of boxes as a
+    matrix with shape [len(boxes_a), len(boxes_b)]."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    union = box_areas(boxes_a)[:, None] + box_areas(boxes_b)[None, :] - \
+        intersection
+
+    return np.where(union > 0, intersection / np.maximum(union, 1e-12), 0.)
+
+
+def boxes_to_frame(boxes: np.ndarray, region, frame_shape) -> np.ndarray:
+    """Maps boxes which are normalized to the (left, top, right, bottom)
+    pixel region of a frame to boxes normalized to the whole frame."""
+    left, top, right, bottom = region
+    height, width = frame_shape[:2]
+
+    scale = np.array([bottom - top, right - left] * 2, dtype=np.float32)
+    offset = np.array([top, left] * 2, dtype=np.float32)
+    size = np.array([height, width] * 2, dtype=np.float32)
+
+    return (np.asarray(boxes, dtype=np.float32) * scale + offset) / size
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray,
+                        iou_thresh=.5, score_thresh=0.):
+    """Class-agnostic non-maximum suppression.
+
+    Returns the indices of the kept boxes, sorted by descending score. The
+    IoU of all candidates is computed at once, every kept box then
+    suppresses its overlapping boxes with a single vectorized comparison."""
+    candidates = np.flatnonzero(scores > score_thresh)
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    iou = box_iou(boxes[candidates], boxes[candidates])
+    suppressed = np.zeros(len(candidates), dtype=bool)
+    keep = []
+
+    for i in range(len(candidates)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_thresh
+
+    return candidates[keep]
+
+
+def merge_regions(regions: List[Tuple[int, int, int, int]]):
+    """Merges overlapping (left, top, right, bottom) pixel regions, so an object
+    which is close to another one isn't detected twice."""
+    regions = list(regions)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]),
+                                  max(a[2], b[2]), max(a[3], b[3]))
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return regions
+
+
+def pad_detections(boxes, scores, num_hands_detect):
+    """Pads boxes and scores, so there are at least `num_hands_detect` of
+    them, like the detector output `get_center_points` expects."""
+    missing = max(0, num_hands_detect - len(scores))
+    boxes = np.concatenate([np.reshape(boxes, (-1, 4)),
+                            np.zeros((missing, 4), dtype=np.float32)])
+    scores = np.concatenate([np.reshape(scores, -1),
+                             np.zeros(missing, dtype=np.float32)])
+    return boxes, scores
@@ -1,7 +1,7 @@
 from typing import Dict, Any, List
 from itertools import product
 
-import yaml, numpy as np
+import cv2, yaml, numpy as np
 
 try:
     from yaml import CLoader as Loader
@@ -14,7 +14,10 @@ class _CalibrationConfig(Dict[str, Any]):
 class Calibration:
     """Represents a calibration file created by calibration.cpp
     
-    Required fields of a calibration file are listed in `required_fields`."""
+    Required fields of a calibration file are listed in `required_fields`.
+
+    Only the marker corners are undistorted, with `undistort_points`, which is
+    much cheaper than remapping the whole frame."""
 
     required_fields = ["camera_matrix", "distortion_coefficients", "ml"]
 
@@ -33,8 +36,8 @@ class Calibration:
         try:
             matrix = [[] for i in range(config["rows"])]
             for row_idx, col_idx in product(range(config["rows"]), range(config["cols"])):
-                matrix[row_idx].append(config["data"][row_idx + col_idx])
-            return np.array(matrix)
+                matrix[row_idx].append(config["data"][row_idx * config["cols"] + col_idx])
+            return np.array(matrix, dtype=np.float64)
         except:
             raise ValueError("The matrix doesn't have the correct format. It needs rows, cols and"
                              " data.")
@@ -47,3 +50,9 @@ class Calibration:
         self.camera_matrix = self._get_matrix(calibration["camera_matrix"])
         self.dist_coeffs = self._get_matrix(calibration["distortion_coefficients"])
         self.ml = calibration["ml"]
+
+    def undistort_points(self, points: np.ndarray) -> np.ndarray:
+        """Undistorts pixel coordinates with shape [N, 2], the result can be used with the camera matrix and without
+        distortion coefficients."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.undistortPoints(points, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix).reshape(-1, 2)
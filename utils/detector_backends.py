@@ -0,0 +1,244 @@
+# Interchangeable runtimes for the hand detector.
+#
+# Every backend returns the same normalized arrays as the frozen TensorFlow
+# graph: `boxes` with shape [batch, detections, 4] in the order
+# (ymin, xmin, ymax, xmax) and `scores` with shape [batch, detections], sorted
+# by descending score. This way `get_center_points` and the drawing functions
+# work with any of them. The runtimes are only imported when a backend is
+# actually created, so none of them is a hard dependency.
+
+import os
+
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import cv2
+
+MODEL_DIR = 'hand_inference_graph'
+
+DEFAULT_MODEL_PATHS = {
+    'tf': os.path.join(MODEL_DIR, 'frozen_inference_graph.pb'),
+    'tflite': os.path.join(MODEL_DIR, 'hand_detector.tflite'),
+    'onnx': os.path.join(MODEL_DIR, 'hand_detector.onnx'),
+    'opencv': os.path.join(MODEL_DIR, 'frozen_inference_graph.pb'),
+}
+
+# Text graph description OpenCV needs next to the frozen graph, it can be
+# generated with OpenCV's `tf_text_graph_ssd.py`.
+DEFAULT_OPENCV_CONFIG_PATH = os.path.join(MODEL_DIR, 'hand_detector.pbtxt')
+
+# Input resolution of the shipped SSD models.
+DEFAULT_INPUT_SIZE = (300, 300)
+
+
+class DetectorBackend:
+    """Interface for all hand detector runtimes."""
+
+    name = ''
+
+    def detect(self, image_np) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the boxes and scores for a single RGB image."""
+        boxes, scores = self.detect_batch([image_np])
+        return boxes[0], scores[0]
+
+    def detect_batch(self, images: List[np.ndarray]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the boxes and scores for a batch of equally sized RGB
+        images."""
+        raise NotImplementedError("This method needs to be implemented by a "
+                                  "sub-class.")
+
+
+def _sort_by_score(boxes, scores):
+    order = np.argsort(-scores, kind='stable')
+    return boxes[order], scores[order]
+
+
+class TFLiteBackend(DetectorBackend):
+    """Runs a TFLite model exported with `export_tflite_ssd_graph.py`, float
+    or (post-training) int8 quantized.
+
+    Uses `tflite_runtime` if it is installed and falls back to `tf.lite`.
+    XNNPACK is the default delegate of recent TFLite versions, setting
+    `use_xnnpack` to `False` disables it."""
+
+    name = 'tflite'
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATHS['tflite'],
+                 num_threads=None, use_xnnpack=True):
+        try:
+            import tflite_runtime.interpreter as tflite
+            op_resolver_types = getattr(tflite, 'OpResolverType', None)
+        except ImportError:
+            from tensorflow import lite as tflite
+            op_resolver_types = getattr(
+                getattr(tflite, 'experimental', None), 'OpResolverType', None)
+
+        kwargs: Dict[str, Any] = {'model_path': model_path}
+        # Versions without the op resolver types don't apply XNNPACK by
+        # default either.
+        if not use_xnnpack and op_resolver_types is not None:
+            kwargs['experimental_op_resolver_type'] = \
+                op_resolver_types.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+
+        if num_threads is not None:
+            kwargs['num_threads'] = num_threads
+
+        try:
+            self.interpreter = tflite.Interpreter(**kwargs)
+        except TypeError:
+            if 'num_threads' not in kwargs:
+                raise
+            # `tf.lite.Interpreter` only takes the number of threads since
+            # TensorFlow 2.3.
+            print("This TFLite version doesn't support setting the number "
+                  "of threads, using its default.")
+            del kwargs['num_threads']
+            self.interpreter = tflite.Interpreter(**kwargs)
+        self.interpreter.allocate_tensors()
+
+        input_details = self.interpreter.get_input_details()[0]
+        self._input_index = input_details['index']
+        self._input_dtype = input_details['dtype']
+        self._input_quantization = input_details['quantization']
+        _, height, width, _ = input_details['shape']
+        self.input_size = (int(width), int(height))
+
+        # The outputs of the TFLite_Detection_PostProcess op are boxes,
+        # classes, scores and the number of detections, in this order.
+        outputs = sorted(self.interpreter.get_output_details(),
+                         key=lambda details: details['name'])
+        self._boxes_index = outputs[0]['index']
+        self._scores_index = outputs[2]['index']
+
+    def _prepare_input(self, image_np):
+        image = cv2.resize(image_np, self.input_size)
+
+        if self._input_dtype == np.uint8:
+            return image[np.newaxis]
+
+        if self._input_dtype == np.int8:
+            scale, zero_point = self._input_quantization
+            image = (image / 127.5 - 1.) / scale + zero_point
+            return np.clip(np.round(image), -128, 127)\
+                .astype(np.int8)[np.newaxis]
+
+        return (image.astype(np.float32) / 127.5 - 1.)[np.newaxis]
+
+    def detect_batch(self, images):
+        # The exported SSD models have a fixed batch size of one.
+        all_boxes, all_scores = [], []
+        for image in images:
+            self.interpreter.set_tensor(self._input_index,
+                                        self._prepare_input(image))
+            self.interpreter.invoke()
+
+            boxes = self.interpreter.get_tensor(self._boxes_index)[0]
+            scores = self.interpreter.get_tensor(self._scores_index)[0]
+            boxes, scores = _sort_by_score(boxes, scores)
+
+            all_boxes.append(boxes)
+            all_scores.append(scores)
+
+        return np.stack(all_boxes), np.stack(all_scores)
+
+
+class OnnxRuntimeBackend(DetectorBackend):
+    """Runs the frozen graph converted with `tf2onnx` on ONNX Runtime's CPU
+    execution provider."""
+
+    name = 'onnx'
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATHS['onnx'],
+                 num_threads=None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=options,
+            providers=['CPUExecutionProvider'])
+
+        self._input_name = self.session.get_inputs()[0].name
+
+        # tf2onnx keeps the TensorFlow tensor names, with or without the
+        # output index.
+        output_names = [output.name for output in self.session.get_outputs()]
+        self._output_names = [
+            next(name for name in output_names if name.startswith(prefix))
+            for prefix in ['detection_boxes', 'detection_scores']
+        ]
+
+    def detect_batch(self, images):
+        boxes, scores = self.session.run(self._output_names,
+                                         {self._input_name: np.stack(images)})
+        return boxes, scores
+
+
+class OpenCVDnnBackend(DetectorBackend):
+    """Runs the frozen graph with OpenCV's DNN module."""
+
+    name = 'opencv'
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATHS['opencv'],
+                 num_threads=None, config_path=DEFAULT_OPENCV_CONFIG_PATH,
+                 input_size=DEFAULT_INPUT_SIZE, max_detections=100):
+        if num_threads:
+            cv2.setNumThreads(num_threads)
+
+        self.net = cv2.dnn.readNetFromTensorflow(model_path, config_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = input_size
+        self.max_detections = max_detections
+
+    def detect_batch(self, images):
+        # The images already are RGB, so the channels must not be swapped.
+        blob = cv2.dnn.blobFromImages(images, size=self.input_size,
+                                      swapRB=False, crop=False)
+        self.net.setInput(blob)
+
+        # Each detection is [image_id, class_id, score, x1, y1, x2, y2].
+        detections = self.net.forward().reshape(-1, 7)
+
+        boxes = np.zeros((len(images), self.max_detections, 4),
+                         dtype=np.float32)
+        scores = np.zeros((len(images), self.max_detections),
+                          dtype=np.float32)
+
+        for i in range(len(images)):
+            image_detections = detections[detections[:, 0] == i]
+            image_boxes, image_scores = _sort_by_score(
+                image_detections[:, [4, 3, 6, 5]], image_detections[:, 2])
+
+            count = min(len(image_scores), self.max_detections)
+            boxes[i, :count] = np.clip(image_boxes[:count], 0, 1)
+            scores[i, :count] = image_scores[:count]
+
+        return boxes, scores
+
+
+BACKENDS = ['tf', 'tflite', 'onnx', 'opencv']
+
+
+def create_detector(backend='tf', model_path=None, num_threads=None,
+                    use_xnnpack=True) -> DetectorBackend:
+    if backend not in BACKENDS:
+        raise ValueError("Unknown detector backend {}, use one of {}."
+                         .format(backend, BACKENDS))
+
+    if model_path is None:
+        model_path = DEFAULT_MODEL_PATHS[backend]
+
+    if backend == 'tf':
+        # Imported here, because detector_utils depends on this module.
+        from .detector_utils import Detector
+        return Detector(model_path=model_path, num_threads=num_threads)
+    if backend == 'tflite':
+        return TFLiteBackend(model_path, num_threads, use_xnnpack)
+    if backend == 'onnx':
+        return OnnxRuntimeBackend(model_path, num_threads)
+
+    return OpenCVDnnBackend(model_path, num_threads)
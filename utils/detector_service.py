@@ -0,0 +1,115 @@
+import time
+
+from queue import Queue, Empty
+from threading import Thread, Event
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .detector_backends import DetectorBackend
+
+
+class _DetectionRequest:
+    def __init__(self, image):
+        self.image = image
+        self.boxes = None
+        self.scores = None
+        self.error = None
+        self.done = Event()
+
+
+class DetectorService(Thread):
+    """Shares one inference graph and session between all workers.
+
+    Workers call `detect()` which blocks until the result is available. The
+    service collects the pending requests into micro-batches of at most
+    `max_batch_size` frames, waiting at most `max_wait` seconds for a batch
+    to fill up, and runs every batch with a single call of the detector
+    backend. Only the service's thread uses the detector, so its input
+    buffer is never shared."""
+
+    def __init__(self, detector: DetectorBackend, max_batch_size=4,
+                 max_wait=0.005):
+        super().__init__(daemon=True)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.detector = detector
+
+        self.num_batches = 0
+        self.num_frames = 0
+
+        self._requests: 'Queue[_DetectionRequest]' = Queue()
+
+    @property
+    def average_batch_size(self):
+        return self.num_frames / self.num_batches if self.num_batches else 0
+
+    @property
+    def stats(self):
+        return "Detector: {} frames in {} batches (average batch size {:.2f})"\
+            .format(self.num_frames, self.num_batches,
+                    self.average_batch_size)
+
+    def detect(self, image, seq=None):
+        # The sequence number isn't needed here, it's accepted so the service
+        # can be used wherever a hand detector is expected.
+        boxes, scores = self.detect_batch([image])
+        return boxes[0], scores[0]
+
+    def detect_batch(self, images):
+        """Submits several images at once, so they can end up in the same
+        batch, and blocks until all of them are done."""
+        requests = [_DetectionRequest(image) for image in images]
+        for request in requests:
+            self._requests.put(request)
+
+        for request in requests:
+            request.done.wait()
+
+            if request.error is not None:
+                raise request.error
+
+        return np.stack([request.boxes for request in requests]), \
+            np.stack([request.scores for request in requests])
+
+    def _collect_batch(self) -> List[_DetectionRequest]:
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except Empty:
+                break
+
+        return batch
+
+    def _run_batch(self, batch: List[_DetectionRequest]):
+        # Only images of the same size can be stacked into one tensor.
+        by_shape: Dict[Tuple, List[_DetectionRequest]] = {}
+        for request in batch:
+            by_shape.setdefault(request.image.shape, []).append(request)
+
+        for requests in by_shape.values():
+            try:
+                boxes, scores = self.detector.detect_batch(
+                    [request.image for request in requests])
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            self.num_batches += 1
+            self.num_frames += len(requests)
+
+            for i, request in enumerate(requests):
+                request.boxes, request.scores = boxes[i], scores[i]
+                request.done.set()
+
+    def run(self):
+        while True:
+            self._run_batch(self._collect_batch())
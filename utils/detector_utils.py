@@ -8,6 +8,7 @@ import tensorflow as tf
 import cv2
 
 from utils import label_map_util
+from utils.detector_backends import DetectorBackend
 
 detection_graph = tf.Graph()
 sys.path.append("..")
@@ -31,18 +32,22 @@ category_index = label_map_util.create_category_index(categories)
 
 
 # Load a frozen infrerence graph into memory
-def load_inference_graph():
+def load_inference_graph(path=PATH_TO_CKPT, num_threads=None):
 
     # load frozen tensorflow model into memory
     #print("> ====== loading HAND frozen graph into memory")
     detection_graph = tf.Graph()
     with detection_graph.as_default():
         od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(PATH_TO_CKPT, 'rb') as fid:
+        with tf.gfile.GFile(path, 'rb') as fid:
             serialized_graph = fid.read()
             od_graph_def.ParseFromString(serialized_graph)
             tf.import_graph_def(od_graph_def, name='')
-        sess = tf.Session(graph=detection_graph)
+        config = None
+        if num_threads:
+            config = tf.ConfigProto(intra_op_parallelism_threads=num_threads,
+                                    inter_op_parallelism_threads=num_threads)
+        sess = tf.Session(graph=detection_graph, config=config)
     #print(">  ====== Hand Inference graph loaded.")
     return detection_graph, sess
 
@@ -63,30 +68,52 @@ def draw_fps_on_image(fps, image_np):
                 cv2.FONT_HERSHEY_SIMPLEX, 0.75, (77, 255, 9), 2)
 
 
-# Actual detection .. generate scores and bounding boxes given an image
-def detect_objects(image_np, detection_graph, sess):
-    # Definite input and output Tensors for detection_graph
-    image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
-    # Each box represents a part of the image where a particular object was
-    # detected.
-    detection_boxes = detection_graph.get_tensor_by_name(
-        'detection_boxes:0')
-    # Each score represent how level of confidence for each of the objects.
-    # Score is shown on the result image, together with the class label.
-    detection_scores = detection_graph.get_tensor_by_name(
-        'detection_scores:0')
-    detection_classes = detection_graph.get_tensor_by_name(
-        'detection_classes:0')
-    num_detections = detection_graph.get_tensor_by_name(
-        'num_detections:0')
-
-    image_np_expanded = np.expand_dims(image_np, axis=0)
-
-    (boxes, scores, classes, num) = sess.run(
-        [detection_boxes, detection_scores,
-            detection_classes, num_detections],
-        feed_dict={image_tensor: image_np_expanded})
-    return np.squeeze(boxes), np.squeeze(scores)
+class Detector(DetectorBackend):
+    """Hot path for running the frozen detection graph with TensorFlow.
+
+    The input and output tensors are resolved only once and a callable for
+    `sess.run` is prebuilt, which only fetches the boxes and scores. The
+    input tensor is copied into a preallocated buffer which is reused as long
+    as the frame size doesn't change."""
+
+    name = 'tf'
+
+    def __init__(self, detection_graph=None, sess=None,
+                 model_path=PATH_TO_CKPT, num_threads=None):
+        if detection_graph is None:
+            detection_graph, sess = load_inference_graph(model_path,
+                                                         num_threads)
+
+        self.detection_graph = detection_graph
+        self.sess = sess
+
+        image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
+        detection_boxes = detection_graph.get_tensor_by_name(
+            'detection_boxes:0')
+        detection_scores = detection_graph.get_tensor_by_name(
+            'detection_scores:0')
+
+        self._run = sess.make_callable([detection_boxes, detection_scores],
+                                       feed_list=[image_tensor])
+        self._input = np.empty((0, 0, 0, 3), dtype=np.uint8)
+
+    def _input_buffer(self, batch_size, image_shape):
+        if self._input.shape[0] < batch_size or \
+                self._input.shape[1:] != image_shape:
+            self._input = np.empty((batch_size,) + image_shape,
+                                   dtype=np.uint8)
+
+        return self._input[:batch_size]
+
+    def detect_batch(self, images):
+        """Runs a batch of equally sized images through the graph with a
+        single `sess.run`."""
+        batch = self._input_buffer(len(images), images[0].shape)
+        for i, image in enumerate(images):
+            batch[i] = image
+
+        boxes, scores = self._run(batch)
+        return boxes, scores
 
 
 def box_edges(box, im_height, im_width):
@@ -0,0 +1,59 @@
+import time
+
+from typing import Dict, List
+
+import numpy as np
+
+
+class Frame:
+    """A frame travelling through the pipeline.
+
+    Every frame is tagged with a monotonically increasing sequence number and
+    the time it was captured, so the results of several workers can be put
+    back into order and the latency of every stage can be measured. The
+    workers only fill in the results, the image is never copied or drawn on;
+    that is left to the display stage.
+
+    `timestamp` is the wall clock time of the capture, `monotonic_time` the
+    same moment on the monotonic clock, which all other times of the frame
+    are measured with. On Linux, the monotonic clock is shared by all
+    processes."""
+
+    def __init__(self, image, seq: int, timestamp: float,
+                 monotonic_time: float = None):
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp
+        self.monotonic_time = time.monotonic() if monotonic_time is None \
+            else monotonic_time
+
+        # Monotonic time at which all results of the frame were available.
+        self.inference_time = None
+
+        # Hand detections, the boxes are normalized to the frame size.
+        self.boxes = None
+        self.scores = None
+        self.center_points: List[Dict] = []
+
+        # Marker detections in the format of `aruco.detectMarkers`.
+        self.marker_corners = []
+        self.marker_ids = None
+        self.markers: List[Dict] = []
+
+        # The marker corners undistorted with the camera calibration, if
+        # there is one, with shape [N, 4, 2].
+        self.undistorted_corners = None
+
+        # The AOI polygons in frame coordinates by name, and which hands
+        # (by index into `center_points`) are inside of them.
+        self.aoi_polygons: Dict[str, np.ndarray] = {}
+        self.hands_in_aois: List[Dict] = []
+
+        # Poses of the AOIs with visible markers, one row per AOI.
+        self.aoi_names: List[str] = []
+        self.aoi_rotation_vecs = None
+        self.aoi_translation_vecs = None
+
+    def wall_time(self, monotonic_time: float) -> float:
+        """Converts a monotonic time of this frame to wall clock time."""
+        return self.timestamp + (monotonic_time - self.monotonic_time)
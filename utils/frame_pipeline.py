@@ -0,0 +1,129 @@
+import itertools
+import time
+
+from queue import Queue
+from typing import Dict, List, Tuple
+
+from .frame import Frame
+from .reorder_buffer import ReorderBuffer
+
+
+def _scale_point(point, scale):
+    return point[0] * scale[0], point[1] * scale[1]
+
+
+def _scale_center_points(center_points: List[Dict], scale) -> List[Dict]:
+    return [dict(center_point,
+                 palm_position=_scale_point(center_point['palm_position'],
+                                            scale),
+                 box=tuple(int(round(value * scale[i % 2]))
+                           for i, value in enumerate(center_point['box'])))
+            for center_point in center_points]
+
+
+def _scale_markers(markers: List[Dict], scale) -> List[Dict]:
+    return [dict(marker,
+                 corners=[[int(round(x * scale[0])), int(round(y * scale[1]))]
+                          for x, y in marker['corners']])
+            for marker in markers]
+
+
+def _scale_hands_in_aois(hands_in_aois: List[Dict], scale) -> List[Dict]:
+    return [dict(hand_in_aoi,
+                 palm_position=_scale_point(hand_in_aoi['palm_position'],
+                                            scale))
+            for hand_in_aoi in hands_in_aois]
+
+
+class FramePipeline:
+    """Keeps up to `max_in_flight` frames queued for the workers at once.
+
+    The driver submits frames as long as there is capacity and consumes the
+    results as they come back, so every worker can be busy at the same time
+    instead of only one. Results pass through a `ReorderBuffer` before they
+    are returned for display and handed to the publishers.
+
+    The frames are processed at capture resolution. If `publish_scale` is
+    given as (x, y) factors, the published coordinates are scaled by it,
+    e.g. into the display frame the subscribers expect."""
+
+    def __init__(self, input_q: Queue, output_q: Queue, max_in_flight=1,
+                 reorder_buffer: ReorderBuffer = None,
+                 center_points_q: Queue = None, marker_q: Queue = None,
+                 aoi_q: Queue = None,
+                 publish_scale: Tuple[float, float] = None):
+        self.input_q = input_q
+        self.output_q = output_q
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        self.reorder_buffer = reorder_buffer or \
+            ReorderBuffer(capacity=self.max_in_flight)
+        self.center_points_q = center_points_q
+        self.marker_q = marker_q
+        self.aoi_q = aoi_q
+        self.publish_scale = publish_scale
+
+        self._seq = itertools.count()
+
+    @property
+    def is_full(self):
+        # Frames held back by the reorder buffer still count as in flight,
+        # otherwise the buffer could fill up while waiting for a slow frame.
+        return self.in_flight + len(self.reorder_buffer) >= self.max_in_flight
+
+    @property
+    def is_empty(self):
+        return self.in_flight == 0
+
+    def submit(self, image, timestamp: float = None,
+               monotonic_time: float = None):
+        """Submits an image captured at the given wall clock and monotonic
+        time, by default now."""
+        if timestamp is None:
+            timestamp, monotonic_time = time.time(), time.monotonic()
+
+        self.input_q.put(Frame(image, next(self._seq), timestamp,
+                               monotonic_time))
+        self.in_flight += 1
+
+    def get(self):
+        """Blocks until the next result is available and returns it."""
+        while True:
+            frame = self.reorder_buffer.pop()
+            if frame is not None:
+                self._publish(frame)
+                return frame
+
+            result = self.output_q.get()
+            self.in_flight = max(0, self.in_flight - 1)
+
+            if result is None:
+                return None
+
+            self.reorder_buffer.put(result)
+
+    def _publish(self, frame: Frame):
+        # The publishers get the detections of a whole frame at once, tagged
+        # with the frame and its capture and inference times (wall clock), so
+        # they can be matched across topics.
+        inference_time = frame.wall_time(frame.inference_time) \
+            if frame.inference_time is not None else None
+        stamp = (frame.seq, frame.timestamp, inference_time)
+        scale = self.publish_scale
+
+        if self.center_points_q is not None:
+            self.center_points_q.put(stamp + (
+                frame.center_points if scale is None else
+                _scale_center_points(frame.center_points, scale),))
+
+        # Frames without markers are passed on as well, so the publisher can
+        # tell when the markers disappeared.
+        if self.marker_q is not None:
+            self.marker_q.put(stamp + (
+                frame.markers if scale is None else
+                _scale_markers(frame.markers, scale),))
+
+        if self.aoi_q is not None and frame.aoi_polygons:
+            self.aoi_q.put(stamp + (
+                frame.hands_in_aois if scale is None else
+                _scale_hands_in_aois(frame.hands_in_aois, scale),))
@@ -0,0 +1,83 @@
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from cv2 import aruco
+
+from .calibration import Calibration
+from .detector_utils import draw_box_on_image
+from .frame import Frame
+from .pose_estimator import PoseEstimator
+
+
+class FrameRenderer:
+    """Draws the results of a frame for display.
+
+    The frame is scaled to the display size first and the annotations are
+    drawn onto the scaled copy, so the captured frame is never modified and
+    nothing is copied or drawn when the frames aren't displayed."""
+
+    def __init__(self, cap_params: Dict[str, Any],
+                 calibration: Calibration = None):
+        self.cap_params = cap_params
+        self.calibration = calibration
+        self.pose_estimator = PoseEstimator(calibration) \
+            if calibration is not None else None
+
+    def render(self, frame: Frame, size: Tuple[int, int] = None):
+        height, width = frame.image.shape[:2]
+
+        if size is None or size == (width, height):
+            image = frame.image.copy()
+        else:
+            image = cv2.resize(frame.image, size)
+
+        display_height, display_width = image.shape[:2]
+        scale = np.array([display_width / width, display_height / height],
+                         dtype=np.float32)
+
+        if frame.boxes is not None:
+            draw_box_on_image(self.cap_params['num_hands_detect'],
+                              self.cap_params['score_thresh'], frame.scores,
+                              frame.boxes, display_width, display_height,
+                              image)
+
+        for name, polygon in frame.aoi_polygons.items():
+            points = (polygon * scale).astype(np.int32)
+            cv2.polylines(image, [points], True, (255, 0, 0), 2)
+            cv2.putText(image, name, tuple(points[0]),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
+
+        if frame.marker_ids is None:
+            return image
+
+        corners = [(corner * scale).astype(np.float32)
+                   for corner in frame.marker_corners]
+        aruco.drawDetectedMarkers(image, corners, frame.marker_ids)
+
+        if self.pose_estimator is None or frame.undistorted_corners is None:
+            return image
+
+        # Scaling the image scales the focal lengths and the principal point.
+        camera_matrix = np.array(self.calibration.camera_matrix,
+                                 dtype=np.float64)
+        camera_matrix[0] *= scale[0]
+        camera_matrix[1] *= scale[1]
+
+        # The markers of an AOI share its pose, so only the AOI's axes are
+        # drawn then. Without AOIs, the marker poses are only estimated for
+        # the frames which are displayed.
+        if frame.aoi_names:
+            poses = zip(frame.aoi_rotation_vecs, frame.aoi_translation_vecs)
+            length = 2 * self.calibration.ml
+        else:
+            poses = zip(*self.pose_estimator.marker_poses(
+                frame.undistorted_corners))
+            length = 0.01
+
+        for rotation_vec, translation_vec in poses:
+            aruco.drawAxis(image, camera_matrix, self.calibration.dist_coeffs,
+                           rotation_vec, translation_vec, length)
+
+        return image
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List
+
+from .hand_tracker import HandTracker
+from .motion_gate import MotionGate
+from .preprocessing import FullFrameDetector
+from .roi_detector import RoiDetector
+from .tiled_detector import TiledDetector
+
+
+def create_hand_detector(detector, cap_params: Dict[str, Any]):
+    """Wraps the (shared) detector with the hand detection strategies
+    configured in `cap_params`.
+
+    The returned object has a `detect(image, seq)` method taking a captured
+    BGR frame and returning boxes and scores for the whole frame."""
+    hand_detector = FullFrameDetector(detector)
+
+    if cap_params.get('tile_layouts'):
+        hand_detector = TiledDetector(
+            hand_detector, cap_params['num_hands_detect'],
+            cap_params['tile_layouts'], cap_params.get('tile_overlap', .2))
+
+    # In ROI mode, the full-frame passes run through the tiles.
+    if cap_params.get('roi', False):
+        hand_detector = RoiDetector(
+            hand_detector, cap_params['num_hands_detect'],
+            cap_params['score_thresh'], cap_params.get('roi_padding', .5),
+            cap_params.get('roi_full_frame_interval', 10))
+
+    if cap_params.get('detection_interval', 1) > 1:
+        hand_detector = HandTracker(
+            hand_detector, cap_params['num_hands_detect'],
+            cap_params['score_thresh'], cap_params['detection_interval'],
+            cap_params.get('min_tracking_confidence', .5))
+
+    # The gate comes first, on a static frame nothing else needs to run.
+    if cap_params.get('motion_threshold', 0) > 0:
+        hand_detector = MotionGate(hand_detector,
+                                   cap_params['motion_threshold'],
+                                   cap_params.get('max_detection_age', 30))
+
+    return hand_detector
+
+
+def hand_detector_stats(hand_detector) -> List[str]:
+    """Collects the statistics of every strategy wrapped around the
+    detector."""
+    stats = []
+    while hand_detector is not None:
+        if hasattr(hand_detector, 'stats'):
+            stats.append(hand_detector.stats)
+        hand_detector = getattr(hand_detector, 'detector', None)
+
+    return stats
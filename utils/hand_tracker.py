@@ -0,0 +1,223 @@
+from threading import Lock
+from typing import List
+
+import cv2
+import numpy as np
+
+from .box_utils import pad_detections
+
+_lk_params = dict(winSize=(15, 15), maxLevel=2,
+                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT,
+                            10, 0.03))
+
+
+class HandTracker:
+    """Runs the detector only on keyframes and tracks the hands in between.
+
+    On a keyframe, feature points are selected inside every detected box. On
+    the following frames the points are tracked with pyramidal Lucas-Kanade
+    optical flow (with a forward-backward check) on a downscaled grayscale
+    frame, and every box is moved by the median displacement of its points.
+    When too few points of a box survive, a new detection is forced.
+
+    The detection interval adapts to the motion, measured by the tracked
+    points and by the distance between consecutive detections, relative to
+    the size of the box, so it doesn't depend on the resolution or on how
+    close the hands are to the camera. It starts at `max_interval`, is
+    halved when the hands move by more than `fast_motion` box sizes per
+    frame or the track is lost, grows by one frame while they move slower
+    and goes back to `max_interval` right away once they move less than
+    `slow_motion` box sizes per frame.
+
+    The tracker is shared by all workers. Frames which are older than the
+    tracked state get the latest boxes."""
+
+    def __init__(self, detector, num_hands_detect, score_thresh,
+                 max_interval=10, min_confidence=0.5, scale=0.5,
+                 fast_motion=0.15, slow_motion=0.02):
+        self.detector = detector
+        self.num_hands_detect = num_hands_detect
+        self.score_thresh = score_thresh
+        self.max_interval = max(1, max_interval)
+        self.min_confidence = min_confidence
+        self.scale = scale
+        # Motion thresholds in box sizes per frame.
+        self.fast_motion = fast_motion
+        self.slow_motion = slow_motion
+
+        self.interval = self.max_interval
+        self.num_detections = 0
+        self.num_tracked = 0
+
+        self._lock = Lock()
+        self._prev_gray = None
+        self._boxes = np.zeros((0, 4), dtype=np.float32)
+        self._scores = np.zeros(0, dtype=np.float32)
+        self._points: List[np.ndarray] = []
+        # Sequence number of the frame the state belongs to, of the last
+        # claimed keyframe and of the last applied detection.
+        self._seq = -1
+        self._keyframe_seq = -1
+        self._detected_seq = -1
+
+    @property
+    def stats(self):
+        return "Hand tracker: {} detections, {} tracked frames, current " \
+               "interval {}".format(self.num_detections, self.num_tracked,
+                                   self.interval)
+
+    def _preprocess(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, None, fx=self.scale, fy=self.scale,
+                          interpolation=cv2.INTER_AREA)
+
+    def _result(self):
+        return pad_detections(self._boxes, self._scores,
+                              self.num_hands_detect)
+
+    def _is_keyframe(self, seq):
+        return self._prev_gray is None or \
+            seq - self._keyframe_seq >= self.interval
+
+    @staticmethod
+    def _box_to_pixels(box, shape):
+        height, width = shape
+        return (int(box[1] * width), int(box[0] * height),
+                int(box[3] * width), int(box[2] * height))
+
+    def _select_points(self, gray, box):
+        left, top, right, bottom = self._box_to_pixels(box, gray.shape)
+        mask = np.zeros_like(gray)
+        mask[max(top, 0):bottom, max(left, 0):right] = 255
+
+        points = cv2.goodFeaturesToTrack(gray, maxCorners=30,
+                                         qualityLevel=0.01, minDistance=3,
+                                         mask=mask)
+        if points is not None and len(points) >= 3:
+            return points.astype(np.float32)
+
+        # Not enough texture, fall back to a regular grid inside the box.
+        xs, ys = np.meshgrid(np.linspace(left, right, 5)[1:-1],
+                             np.linspace(top, bottom, 5)[1:-1])
+        return np.stack([xs.ravel(), ys.ravel()], axis=1)\
+            .reshape(-1, 1, 2).astype(np.float32)
+
+    def _adapt_interval(self, motion):
+        if motion > self.fast_motion:
+            self.interval = max(1, self.interval // 2)
+        elif motion < self.slow_motion:
+            self.interval = self.max_interval
+        else:
+            self.interval = min(self.max_interval, self.interval + 1)
+
+    @staticmethod
+    def _box_size(box, shape):
+        height, width = shape
+        return max(1., float((box[2] - box[0]) * height +
+                             (box[3] - box[1]) * width) / 2)
+
+    def _box_motion(self, boxes, num_frames, shape):
+        """Estimates the motion per frame from the distance of every box to
+        the nearest previous box, relative to the size of the box."""
+        if not len(boxes) or not len(self._boxes):
+            return 0.
+
+        height, width = shape
+        scale = np.array([height, width], dtype=np.float32)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2 * scale
+        previous = (self._boxes[:, :2] + self._boxes[:, 2:]) / 2 * scale
+        distances = np.linalg.norm(centers[:, None] - previous[None], axis=2)
+        sizes = np.array([self._box_size(box, shape) for box in boxes])
+
+        return float((distances.min(axis=1) / sizes).max()) / \
+            max(1, num_frames)
+
+    def _reset(self, gray, boxes, scores, seq):
+        keep = np.argsort(-scores)[:self.num_hands_detect]
+        keep = keep[scores[keep] > self.score_thresh]
+
+        if self._prev_gray is not None:
+            self._adapt_interval(self._box_motion(boxes[keep], seq - self._seq,
+                                                  gray.shape))
+
+        self._boxes = boxes[keep].astype(np.float32)
+        self._scores = scores[keep].astype(np.float32)
+        self._points = [self._select_points(gray, box) for box in self._boxes]
+        self._prev_gray = gray
+        self._seq = seq
+        self._detected_seq = seq
+
+    def _track(self, gray, seq) -> bool:
+        """Moves the boxes to `gray`, returns `False` if the tracking
+        confidence is too low."""
+        if not self._points:
+            self._prev_gray = gray
+            self._seq = seq
+            return True
+
+        points = np.concatenate(self._points)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev_gray, gray, points, None, **_lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(
+            gray, self._prev_gray, next_points, None, **_lk_params)
+
+        forward_backward_error = np.linalg.norm(
+            (points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & \
+            (forward_backward_error < 1.)
+
+        height, width = gray.shape
+        boxes, all_points, motion = [], [], 0.
+        start = 0
+        for box, box_points in zip(self._boxes, self._points):
+            end = start + len(box_points)
+            box_good = good[start:end]
+
+            if box_good.mean() < self.min_confidence or box_good.sum() < 3:
+                return False
+
+            displacement = np.median(
+                (next_points[start:end] - box_points)[box_good]
+                .reshape(-1, 2), axis=0)
+            dx, dy = displacement
+            boxes.append(np.clip(box + np.array([dy / height, dx / width,
+                                                 dy / height, dx / width]),
+                                 0, 1))
+            all_points.append(next_points[start:end][box_good])
+            motion = max(motion, float(np.hypot(dx, dy)) /
+                         self._box_size(box, gray.shape))
+            start = end
+
+        self._boxes = np.array(boxes, dtype=np.float32)
+        self._points = all_points
+        self._prev_gray = gray
+        self._seq = seq
+
+        self._adapt_interval(motion)
+
+        return True
+
+    def detect(self, image, seq):
+        gray = self._preprocess(image)
+
+        with self._lock:
+            if not self._is_keyframe(seq):
+                if seq <= self._seq or self._track(gray, seq):
+                    self.num_tracked += 1
+                    return self._result()
+
+                # Lost track, detect more often for a while.
+                self.interval = max(1, self.interval // 2)
+
+            # Claim the keyframe, so the other workers keep tracking while
+            # the detector runs.
+            self._keyframe_seq = seq
+
+        boxes, scores = self.detector.detect(image, seq)
+
+        with self._lock:
+            self.num_detections += 1
+            if seq > self._detected_seq:
+                self._reset(gray, boxes, scores, seq)
+
+        return boxes, scores
@@ -0,0 +1,85 @@
+from threading import Lock
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from .aoi import Aoi
+
+
+class _Entry:
+    def __init__(self, homography, corners: Dict[int, np.ndarray], seq: int):
+        self.homography = homography
+        self.corners = corners
+        self.seq = seq
+
+
+class HomographyCache:
+    """Keeps the homography of every AOI from the frame it was defined on to
+    the current frame.
+
+    The homography is only computed again when one of the AOI's markers moved
+    by more than `threshold` pixels or a marker showed up which wasn't used
+    for it. Markers which disappeared don't invalidate it, and if all of them
+    are hidden, e.g. by a hand, the previous homography is kept for up to
+    `max_occlusion` frames."""
+
+    def __init__(self, threshold=1., max_occlusion=30):
+        self.threshold = threshold
+        self.max_occlusion = max_occlusion
+
+        self.num_hits = 0
+        self.num_misses = 0
+
+        self._lock = Lock()
+        self._entries: Dict[int, _Entry] = {}
+
+    @property
+    def stats(self):
+        return "Homography cache: {} hits, {} misses"\
+            .format(self.num_hits, self.num_misses)
+
+    def _is_valid(self, entry: _Entry, corners: Dict[int, np.ndarray]):
+        if not set(corners) <= set(entry.corners):
+            return False
+
+        return all(np.abs(marker_corners - entry.corners[marker_id]).max()
+                   <= self.threshold
+                   for marker_id, marker_corners in corners.items())
+
+    def get(self, aoi: Aoi, corners_by_id: Dict[int, np.ndarray], seq: int) \
+            -> Optional[np.ndarray]:
+        """Returns the homography of the AOI for the frame with the given
+        marker corners (by id), or None if its markers haven't been seen for
+        too long."""
+        corners = {marker_id: corners_by_id[marker_id]
+                   for marker_id in aoi.reference_corners
+                   if marker_id in corners_by_id}
+
+        with self._lock:
+            entry = self._entries.get(id(aoi))
+
+            if entry is not None and (
+                    self._is_valid(entry, corners) if corners else
+                    seq - entry.seq <= self.max_occlusion):
+                if corners:
+                    entry.seq = max(entry.seq, seq)
+                self.num_hits += 1
+                return entry.homography
+
+            self.num_misses += 1
+
+        if not corners:
+            return None
+
+        homography, _ = cv2.findHomography(
+            np.concatenate([aoi.reference_corners[marker_id]
+                            for marker_id in corners]),
+            np.concatenate(list(corners.values())))
+
+        with self._lock:
+            entry = self._entries.get(id(aoi))
+            if entry is None or seq >= entry.seq:
+                self._entries[id(aoi)] = _Entry(homography, corners, seq)
+
+        return homography
@@ -0,0 +1,191 @@
+from threading import Lock
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from cv2 import aruco
+
+from .box_utils import merge_regions
+
+# 117 was found out by testing with static test-images. The real number of the
+#  markers created by the Pupil team is not known/does not work
+#  (see https://github.com/pupil-labs/pupil-helpers/tree/master/markers_stickersheet).
+_aruco_dict = aruco.Dictionary_create(117, 3)
+_aruco_parameters = aruco.DetectorParameters_create()
+
+_subpix_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30,
+                    .01)
+
+
+def refine_corners(gray, corners, window_size=5):
+    """Refines the corners in the format of `aruco.detectMarkers` with
+    sub-pixel accuracy on the grayscale image."""
+    if not len(corners):
+        return corners
+
+    points = np.concatenate(corners).reshape(-1, 1, 2).astype(np.float32)
+    cv2.cornerSubPix(gray, points, (window_size, window_size), (-1, -1),
+                     _subpix_criteria)
+
+    return [marker_points.reshape(1, 4, 2)
+            for marker_points in np.split(points, len(corners))]
+
+
+class MarkerDetector:
+    """Runs `aruco.detectMarkers` on the whole frame."""
+
+    def detect(self, image, seq):
+        corners, ids, _ = aruco.detectMarkers(image, _aruco_dict,
+                                              parameters=_aruco_parameters)
+        return list(corners), ids
+
+
+class PyramidMarkerDetector:
+    """Runs `aruco.detectMarkers` on a copy of the frame which is scaled down
+    by `scale`, and refines the corners it finds on the full-resolution frame
+    with sub-pixel accuracy.
+
+    The window of the refinement has to cover the error of the scaled
+    corners, so it grows as the scale shrinks."""
+
+    def __init__(self, scale=.5, window_size=None):
+        self.scale = scale
+        self.window_size = window_size or max(5, int(np.ceil(2 / scale)))
+
+    def detect(self, image, seq):
+        gray = image
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale,
+                           interpolation=cv2.INTER_AREA)
+        corners, ids, _ = aruco.detectMarkers(small, _aruco_dict,
+                                              parameters=_aruco_parameters)
+
+        # Corner (x, y) of the small image is the center of a pixel block of
+        # the full image.
+        corners = [(marker_corners + .5) / self.scale - .5
+                   for marker_corners in corners]
+
+        return refine_corners(gray, corners, self.window_size), ids
+
+
+class MarkerTracker:
+    """Looks for the markers only in padded regions around the markers found
+    on the previous frame.
+
+    The regions are cut from the full-resolution frame and the corners found
+    in them are refined with sub-pixel accuracy. After `full_scan_interval`
+    ROI detections (frames on which the marker detection is skipped don't
+    count), whenever one of the known markers wasn't found again, and as long
+    as no marker is known, the whole frame is scanned by `detector`, to pick
+    up new markers."""
+
+    def __init__(self, detector, padding=.5, full_scan_interval=30,
+                 min_region_size=48):
+        self.detector = detector
+        self.padding = padding
+        self.full_scan_interval = max(1, full_scan_interval)
+        self.min_region_size = min_region_size
+
+        self.num_full_scans = 0
+        self.num_roi_scans = 0
+
+        self._lock = Lock()
+        self._corners = []
+        self._ids = None
+        self._seq = -1
+        self._roi_scans_since_full_scan = 0
+
+    @property
+    def stats(self):
+        return "Marker tracker: {} full scans, {} ROI scans"\
+            .format(self.num_full_scans, self.num_roi_scans)
+
+    def _regions(self, shape):
+        height, width = shape[:2]
+        regions = []
+        for marker_corners in self._corners:
+            points = marker_corners.reshape(4, 2)
+            left, top = points.min(0)
+            right, bottom = points.max(0)
+            pad = max(self.padding * max(right - left, bottom - top),
+                      self.min_region_size / 2)
+
+            regions.append((int(max(0, left - pad)), int(max(0, top - pad)),
+                            int(min(width, right + pad)),
+                            int(min(height, bottom + pad))))
+
+        return merge_regions(regions)
+
+    @staticmethod
+    def _detect_regions(image, regions):
+        corners, ids = [], []
+        for left, top, right, bottom in regions:
+            crop = image[top:bottom, left:right]
+            if crop.ndim == 3:
+                crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+            crop_corners, crop_ids, _ = aruco.detectMarkers(
+                crop, _aruco_dict, parameters=_aruco_parameters)
+            if crop_ids is None:
+                continue
+
+            offset = np.array([left, top], dtype=np.float32)
+            corners += [marker_corners + offset for marker_corners
+                        in refine_corners(crop, list(crop_corners))]
+            ids.append(crop_ids)
+
+        return corners, np.concatenate(ids) if ids else None
+
+    def detect(self, image, seq):
+        with self._lock:
+            full_scan = self._ids is None or \
+                self._roi_scans_since_full_scan >= self.full_scan_interval
+            if not full_scan:
+                self._roi_scans_since_full_scan += 1
+                known_ids = set(self._ids.ravel())
+                regions = self._regions(image.shape)
+
+        if not full_scan:
+            corners, ids = self._detect_regions(image, regions)
+            self.num_roi_scans += 1
+
+            # A marker disappeared, it may have moved out of its region.
+            found_ids = set() if ids is None else set(ids.ravel())
+            full_scan = not known_ids <= found_ids
+
+        if full_scan:
+            corners, ids = self.detector.detect(image, seq)
+            self.num_full_scans += 1
+
+        with self._lock:
+            if full_scan:
+                self._roi_scans_since_full_scan = 0
+            if seq > self._seq:
+                self._corners = corners
+                self._ids = ids
+                self._seq = seq
+
+        return corners, ids
+
+
+def create_marker_detector(cap_params: Dict[str, Any]):
+    """Returns the marker detector configured in `cap_params`.
+
+    Its `detect(image, seq)` method takes a captured BGR frame and returns
+    the corners and ids in the format of `aruco.detectMarkers`."""
+    if cap_params.get('marker_scale', 1.) < 1:
+        marker_detector = PyramidMarkerDetector(cap_params['marker_scale'])
+    else:
+        marker_detector = MarkerDetector()
+
+    # In ROI mode, the full scans run on the scaled frame.
+
+    if cap_params.get('marker_roi', False):
+        marker_detector = MarkerTracker(
+            marker_detector, cap_params.get('marker_roi_padding', .5),
+            cap_params.get('marker_full_scan_interval', 30))
+
+    return marker_detector
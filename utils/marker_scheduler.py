@@ -0,0 +1,102 @@
+from threading import Lock
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from .motion_gate import gray_thumbnail
+
+
+class MarkerScheduler:
+    """Decides on which frames the markers are actually detected.
+
+    The markers are taped to the table and hardly ever move, so there is no
+    need to look for them on every frame. Depending on the policy, they are
+    detected on every `interval`th frame, whenever the frame changed by more
+    than `motion_threshold` gray levels since the last detection, or at
+    `rate` detections per second. Regardless of the policy, the markers are
+    detected again once the last detection is `max_age` seconds old, or right
+    away after `force_rescan()`."""
+
+    EVERY_NTH = 'every-nth'
+    ON_MOTION = 'on-motion'
+    RATE = 'rate'
+
+    policies = [EVERY_NTH, ON_MOTION, RATE]
+
+    def __init__(self, policy=EVERY_NTH, interval=1, rate=5.,
+                 motion_threshold=2., max_age=5., size=(64, 36)):
+        if policy not in self.policies:
+            raise ValueError("Unknown marker scheduling policy {}."
+                             .format(policy))
+
+        self.policy = policy
+        self.interval = max(1, interval)
+        self.rate = rate
+        self.motion_threshold = motion_threshold
+        self.max_age = max_age
+        self.size = size
+
+        self.num_scans = 0
+        self.num_skipped = 0
+
+        self._lock = Lock()
+        self._forced = True
+        self._reference = None
+        self._last_seq = -1
+        self._last_time = 0.
+
+    @property
+    def stats(self):
+        return "Marker scheduler ({}): {} scans, {} skipped"\
+            .format(self.policy, self.num_scans, self.num_skipped)
+
+    def force_rescan(self):
+        """Makes the next frame run the marker detection."""
+        with self._lock:
+            self._forced = True
+
+    def _is_due(self, thumbnail, seq, timestamp):
+        if self._forced or timestamp - self._last_time >= self.max_age:
+            return True
+
+        if self.policy == self.EVERY_NTH:
+            return seq - self._last_seq >= self.interval
+
+        if self.policy == self.RATE:
+            return timestamp - self._last_time >= 1 / self.rate
+
+        return np.mean(cv2.absdiff(thumbnail, self._reference)) >= \
+            self.motion_threshold
+
+    def should_run(self, image, seq: int, timestamp: float) -> bool:
+        """Returns whether the markers have to be detected on this frame,
+        captured at `timestamp` seconds (on a monotonic clock).
+
+        The frame counts as scanned right away, so frames processed at the
+        same time by other threads don't scan as well."""
+        thumbnail = None
+        if self.policy == self.ON_MOTION:
+            thumbnail = gray_thumbnail(image, self.size)
+
+        with self._lock:
+            if not self._is_due(thumbnail, seq, timestamp):
+                self.num_skipped += 1
+                return False
+
+            self.num_scans += 1
+            self._forced = False
+            self._reference = thumbnail
+            self._last_seq = max(self._last_seq, seq)
+            self._last_time = max(self._last_time, timestamp)
+
+        return True
+
+
+def create_marker_scheduler(cap_params: Dict[str, Any]) -> MarkerScheduler:
+    return MarkerScheduler(cap_params.get('marker_policy',
+                                          MarkerScheduler.EVERY_NTH),
+                           cap_params.get('marker_interval', 1),
+                           cap_params.get('marker_rate', 5.),
+                           cap_params.get('marker_motion_threshold', 2.),
+                           cap_params.get('marker_max_age', 5.))
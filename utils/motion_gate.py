@@ -0,0 +1,63 @@
+from threading import Lock
+
+import cv2
+import numpy as np
+
+
+def gray_thumbnail(image, size):
+    """Shrinks a BGR frame to a small grayscale thumbnail of the given
+    (width, height), to compare frames cheaply."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+class MotionGate:
+    """Skips the detector when the frame hardly changed.
+
+    Every frame is shrunk to a small grayscale thumbnail and compared with
+    the thumbnail of the frame the cached detections belong to. If the mean
+    absolute difference is below `threshold` (in gray levels), the cached
+    detections are reused. Comparing with that frame instead of the previous
+    one makes sure slow changes add up. After `max_age` frames the detections
+    are refreshed anyway."""
+
+    def __init__(self, detector, threshold=2., max_age=30, size=(64, 36)):
+        self.detector = detector
+        self.threshold = threshold
+        self.max_age = max_age
+        self.size = size
+
+        self.num_inferences = 0
+        self.num_skipped = 0
+
+        self._lock = Lock()
+        self._reference = None
+        self._result = None
+        self._result_seq = -1
+
+    @property
+    def stats(self):
+        return "Motion gate: {} inferences, {} skipped"\
+            .format(self.num_inferences, self.num_skipped)
+
+    def detect(self, image, seq):
+        thumbnail = gray_thumbnail(image, self.size)
+
+        with self._lock:
+            if self._reference is not None and \
+                    seq - self._result_seq < self.max_age:
+                change = np.mean(cv2.absdiff(thumbnail, self._reference))
+                if change < self.threshold:
+                    self.num_skipped += 1
+                    return self._result
+
+        result = self.detector.detect(image, seq)
+
+        with self._lock:
+            self.num_inferences += 1
+            if seq > self._result_seq:
+                self._reference = thumbnail
+                self._result = result
+                self._result_seq = seq
+
+        return result
@@ -0,0 +1,122 @@
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from cv2 import aruco
+
+from .aoi import Aoi
+from .calibration import Calibration
+
+
+class PoseEstimator:
+    """Estimates the poses of the markers and of the AOIs of a frame.
+
+    The corners of all markers of a frame are undistorted at once, so the
+    poses are computed without distortion coefficients. Every AOI is treated
+    as a rigid board made of its markers: the position of each marker on the
+    board is learned once from the single-marker poses in the frame the AOI
+    was defined on. After that, a single `solvePnP` over the corners of all
+    visible markers gives the pose of the AOI, which is steadier than the
+    pose of any of its markers and costs one call per AOI."""
+
+    def __init__(self, calibration: Calibration):
+        self.calibration = calibration
+
+        half_length = calibration.ml / 2
+        self._marker_points = np.array([[-half_length, half_length, 0],
+                                        [half_length, half_length, 0],
+                                        [half_length, -half_length, 0],
+                                        [-half_length, -half_length, 0]],
+                                       dtype=np.float64)
+
+        # Marker corners in board coordinates, by marker id, for every AOI.
+        self._boards: Dict[int, Dict[int, np.ndarray]] = {}
+        self._lock = Lock()
+
+    def _learn_board(self, aoi: Aoi) -> Dict[int, np.ndarray]:
+        marker_ids = sorted(aoi.reference_corners)
+        if not marker_ids:
+            return {}
+
+        rotation_vecs, translation_vecs = self.marker_poses(
+            self.undistort_corners([aoi.reference_corners[marker_id]
+                                    for marker_id in marker_ids]))
+
+        # The board's coordinate system is the one of its first marker.
+        origin_rotation = cv2.Rodrigues(rotation_vecs[0])[0]
+        origin_translation = translation_vecs[0]
+
+        board = {}
+        for marker_id, rotation_vec, translation_vec in \
+                zip(marker_ids, rotation_vecs, translation_vecs):
+            rotation = cv2.Rodrigues(rotation_vec)[0]
+            camera_points = self._marker_points @ rotation.T + translation_vec
+            board[marker_id] = (camera_points - origin_translation) @ \
+                origin_rotation
+
+        return board
+
+    def _board(self, aoi: Aoi) -> Dict[int, np.ndarray]:
+        with self._lock:
+            if id(aoi) not in self._boards:
+                self._boards[id(aoi)] = self._learn_board(aoi)
+            return self._boards[id(aoi)]
+
+    def undistort_corners(self, corners: List[np.ndarray]) -> np.ndarray:
+        """Undistorts the corners of all markers of a frame, in the format of
+        `aruco.detectMarkers`, at once. Returns an array with shape
+        [N, 4, 2]."""
+        if not len(corners):
+            return np.zeros((0, 4, 2))
+
+        return self.calibration.undistort_points(
+            np.concatenate(corners).reshape(-1, 2)).reshape(-1, 4, 2)
+
+    def marker_poses(self, points: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the rotation and translation vectors of the markers given
+        by their undistorted corners, with one row per marker."""
+        if not len(points):
+            return np.zeros((0, 3)), np.zeros((0, 3))
+
+        rotation_vecs, translation_vecs, _ = aruco.estimatePoseSingleMarkers(
+            list(points.reshape(-1, 1, 4, 2).astype(np.float32)),
+            self.calibration.ml, self.calibration.camera_matrix, None)
+
+        return rotation_vecs.reshape(-1, 3), translation_vecs.reshape(-1, 3)
+
+    def aoi_poses(self, points: np.ndarray, ids: Optional[np.ndarray],
+                  aois: List[Aoi]) \
+            -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Returns the names, rotation and translation vectors of the AOIs
+        with at least one visible marker, given the undistorted corners of
+        the markers and their ids."""
+        names, rotation_vecs, translation_vecs = [], [], []
+        points_by_id = {} if ids is None else \
+            dict(zip(ids.ravel().tolist(), points))
+
+        for aoi in aois:
+            board = self._board(aoi)
+            visible_ids = [marker_id for marker_id in board
+                           if marker_id in points_by_id]
+            if not visible_ids:
+                continue
+
+            found, rotation_vec, translation_vec = cv2.solvePnP(
+                np.concatenate([board[marker_id]
+                                for marker_id in visible_ids]),
+                np.concatenate([points_by_id[marker_id]
+                                for marker_id in visible_ids])
+                .astype(np.float64),
+                self.calibration.camera_matrix, None)
+            if not found:
+                continue
+
+            names.append(aoi.name)
+            rotation_vecs.append(rotation_vec.ravel())
+            translation_vecs.append(translation_vec.ravel())
+
+        return names, np.array(rotation_vecs).reshape(-1, 3), \
+            np.array(translation_vecs).reshape(-1, 3)
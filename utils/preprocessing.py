@@ -0,0 +1,33 @@
+import cv2
+
+from .detector_backends import DEFAULT_INPUT_SIZE
+
+
+def to_model_input(image, input_size=DEFAULT_INPUT_SIZE):
+    """Turns a captured BGR frame (or a crop of it) into the RGB input of the
+    model in one pass.
+
+    The frame is scaled straight to the model's resolution, bilinear like the
+    model's own resize, and only then converted to RGB, so the color
+    conversion only touches the model's pixels."""
+    image = cv2.resize(image, input_size, interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class FullFrameDetector:
+    """Runs the detector on the whole captured frame.
+
+    This is the innermost hand detection strategy, it turns the captured
+    frame into the model input. Batches are expected to already be model
+    inputs."""
+
+    def __init__(self, detector, input_size=DEFAULT_INPUT_SIZE):
+        self.detector = detector
+        self.input_size = input_size
+
+    def detect(self, image, seq):
+        return self.detector.detect(to_model_input(image, self.input_size),
+                                    seq)
+
+    def detect_batch(self, images):
+        return self.detector.detect_batch(images)
@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import traceback
+
+from queue import Empty, Queue
+from threading import Semaphore, Thread
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .aoi import Aoi
+from .aoi_engine import create_aoi_engine
+from .calibration import Calibration
+from .detector_backends import create_detector
+from .detector_service import DetectorService
+from .frame import Frame
+from .hand_detection import create_hand_detector
+from .shared_frame_pool import SharedFramePool
+from .synchronized_variable import SynchronizedVariable
+from .worker import Worker
+
+
+def _run_worker_process(task_q, result_q, slot_names: List[str],
+                        cap_params: Dict[str, Any],
+                        detector_config: Dict[str, Any],
+                        calibration: Calibration = None, rescan=None,
+                        stats_request=None, stats_q=None):
+    frame_pool = SharedFramePool.attach(slot_names)
+
+    # Each process runs one hand and one marker detection thread, so batching
+    # would not help here.
+    detector = DetectorService(create_detector(**detector_config),
+                               max_batch_size=1, max_wait=0)
+    detector.start()
+
+    input_q: 'Queue[Frame]' = Queue()
+    output_q: 'Queue[Frame]' = Queue()
+    slots: Dict[int, int] = {}
+    # A task is only taken from the shared queue once the previous frame is
+    # done, so a busy process doesn't build up a backlog of its own while
+    # the other processes are idle.
+    ready = Semaphore(1)
+
+    worker = Worker(input_q, output_q, cap_params,
+                    create_hand_detector(detector, cap_params),
+                    SynchronizedVariable([]), calibration).start()
+
+    def send_results():
+        while True:
+            result = output_q.get()
+
+            if result is None:
+                result_q.put(None)
+                continue
+
+            # Only the results go back, the driver still has the frame itself.
+            result.image = None
+            # The worker passes on every frame, even if a detection failed,
+            # so every slot is released.
+            result_q.put((slots.pop(result.seq), result))
+            ready.release()
+
+    Thread(target=send_results, daemon=True).start()
+
+    # The statistics of the detection strategies only exist in this process.
+    def send_stats():
+        while True:
+            stats_request.wait()
+            stats_request.clear()
+            stats_q.put((os.getpid(), worker.stats))
+
+    if stats_request is not None:
+        Thread(target=send_stats, daemon=True).start()
+
+    while True:
+        ready.acquire()
+        task = task_q.get()
+
+        if task is None:
+            ready.release()
+            input_q.put(None)
+            continue
+
+        if rescan is not None and rescan.is_set():
+            rescan.clear()
+            worker.rescan_markers()
+
+        slot, shape, seq, timestamp, monotonic_time = task
+        slots[seq] = slot
+        input_q.put(Frame(frame_pool.view(slot, shape), seq, timestamp,
+                          monotonic_time))
+
+
+class ProcessWorkerPool:
+    """Runs the workers in separate processes instead of threads.
+
+    From the outside, the pool behaves like the threaded workers: it takes
+    frames from `input_q` and puts the results into `output_q`. Internally,
+    the frames are copied into a `SharedFramePool` and only the slot indices
+    are sent to the worker processes. Detectors can't be shared between
+    processes, so every process creates its own from `detector_config`
+    (the arguments of `create_detector`)."""
+
+    def __init__(self, input_q: Queue, output_q: Queue, num_workers: int,
+                 frame_shape: Tuple[int, ...], num_slots: int,
+                 cap_params: Dict[str, Any], detector_config: Dict[str, Any],
+                 latest_markers: SynchronizedVariable[List[Dict]],
+                 calibration: Calibration = None,
+                 aois: SynchronizedVariable[List[Aoi]] = None):
+        self.input_q = input_q
+        self.output_q = output_q
+        self.latest_markers = latest_markers
+        self.aoi_engine = create_aoi_engine(aois, calibration, cap_params) \
+            if aois is not None else None
+        # The driver's frames by sequence number, to hand them back together
+        # with their results.
+        self._frames: Dict[int, Frame] = {}
+        self.frame_pool = SharedFramePool(num_slots,
+                                          int(np.prod(frame_shape)))
+
+        # Forking a process which already loaded TensorFlow is not safe.
+        context = multiprocessing.get_context('spawn')
+        self._task_q = context.Queue()
+        self._result_q = context.Queue()
+        # Every process has its own marker scheduler, so a rescan has to be
+        # requested from each of them.
+        self._rescan_events = [context.Event() for _ in range(num_workers)]
+        self._stats_events = [context.Event() for _ in range(num_workers)]
+        self._stats_q = context.Queue()
+        self._processes = [
+            context.Process(target=_run_worker_process, daemon=True,
+                            args=(self._task_q, self._result_q,
+                                  self.frame_pool.names, cap_params,
+                                  detector_config, calibration, rescan,
+                                  stats_request, self._stats_q))
+            for rescan, stats_request in zip(self._rescan_events,
+                                             self._stats_events)
+        ]
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+
+        Thread(target=self._feed, daemon=True).start()
+        Thread(target=self._collect, daemon=True).start()
+
+        return self
+
+    def rescan_markers(self):
+        for rescan in self._rescan_events:
+            rescan.set()
+
+    def stats(self, timeout=1.) -> List[str]:
+        """Collects the statistics of the worker processes, waiting up to
+        `timeout` seconds for each of them, and of the AOI engine."""
+        for stats_request in self._stats_events:
+            stats_request.set()
+
+        stats = []
+        for _ in self._processes:
+            try:
+                pid, process_stats = self._stats_q.get(timeout=timeout)
+            except Empty:
+                stats.append("Some worker processes didn't send their "
+                             "statistics.")
+                break
+            stats.extend("Process {}: {}".format(pid, line)
+                         for line in process_stats)
+
+        if self.aoi_engine is not None:
+            stats.append(self.aoi_engine.stats)
+
+        return stats
+
+    def _feed(self):
+        while True:
+            frame: Frame = self.input_q.get()
+
+            if frame is None:
+                self._task_q.put(None)
+                continue
+
+            slot = self.frame_pool.acquire()
+            shape = self.frame_pool.write(slot, frame.image)
+            self._frames[frame.seq] = frame
+            self._task_q.put((slot, shape, frame.seq, frame.timestamp,
+                              frame.monotonic_time))
+
+    def _collect(self):
+        while True:
+            task = self._result_q.get()
+
+            if task is None:
+                self.output_q.put(None)
+                continue
+
+            slot, result = task
+            self.frame_pool.release(slot)
+
+            result.image = self._frames.pop(result.seq).image
+
+            # The worker processes can't share `latest_markers`, so it is
+            # updated here instead.
+            if result.markers:
+                self.latest_markers.value = result.markers
+
+            # The AOIs are defined in this process, so they are located
+            # here as well.
+            try:
+                if self.aoi_engine is not None:
+                    self.aoi_engine.process(result)
+            except Exception:
+                print("Locating the AOIs failed on frame {}:"
+                      .format(result.seq))
+                traceback.print_exc()
+            finally:
+                self.output_q.put(result)
+
+    def stop(self):
+        for process in self._processes:
+            process.terminate()
+
+        self.frame_pool.close()
@@ -0,0 +1,65 @@
+import heapq
+
+from typing import List, Optional, Tuple
+
+from .frame import Frame
+
+
+class ReorderBuffer:
+    """Puts frames which were processed by several workers back into order.
+
+    In `IN_ORDER` mode frames are held back until all of their predecessors
+    were emitted. If the buffer reaches its capacity, it skips ahead to the
+    oldest buffered frame, the skipped frames are dropped once they arrive.
+    In `DROP_LATE` mode frames are emitted as soon as they arrive and every
+    frame older than the last emitted one is dropped."""
+
+    IN_ORDER = 'in-order'
+    DROP_LATE = 'drop-late'
+    modes = [IN_ORDER, DROP_LATE]
+
+    def __init__(self, mode=IN_ORDER, capacity=8):
+        if mode not in self.modes:
+            raise ValueError("Unknown reorder mode {}, use one of {}."
+                             .format(mode, self.modes))
+
+        self.mode = mode
+        self.capacity = max(1, capacity)
+
+        # Frames which arrived before one of their predecessors.
+        self.reordered = 0
+        # Frames which arrived after a newer frame was already emitted.
+        self.dropped = 0
+
+        self._heap: List[Tuple[int, Frame]] = []
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, frame: Frame):
+        if frame.seq < self._next_seq:
+            self.dropped += 1
+            return
+
+        if frame.seq > self._next_seq:
+            self.reordered += 1
+
+        heapq.heappush(self._heap, (frame.seq, frame))
+
+    def pop(self) -> Optional[Frame]:
+        """Returns the next frame which may be emitted or `None` if there is
+        none yet."""
+        if not self._heap:
+            return None
+
+        seq, _ = self._heap[0]
+
+        if self.mode == self.IN_ORDER and seq != self._next_seq \
+                and len(self._heap) < self.capacity:
+            return None
+
+        _, frame = heapq.heappop(self._heap)
+        self._next_seq = seq + 1
+
+        return frame
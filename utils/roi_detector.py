@@ -0,0 +1,99 @@
+from threading import Lock
+
+import numpy as np
+
+from .box_utils import boxes_to_frame, merge_regions, pad_detections
+from .preprocessing import to_model_input
+
+
+class RoiDetector:
+    """Runs the detector on padded crops around the hands of the previous
+    frame instead of the whole frame.
+
+    The crops are scaled to the model's input size, so small hands keep more
+    detail, and run as one batch. The detected boxes are mapped back to
+    full-frame coordinates. Every `full_frame_interval` frames, and whenever
+    no hand was found, the whole frame is used to pick up new hands."""
+
+    def __init__(self, detector, num_hands_detect, score_thresh, padding=.5,
+                 full_frame_interval=10, min_crop_size=160,
+                 input_size=(300, 300)):
+        self.detector = detector
+        self.num_hands_detect = num_hands_detect
+        self.score_thresh = score_thresh
+        self.padding = padding
+        self.full_frame_interval = max(1, full_frame_interval)
+        self.min_crop_size = min_crop_size
+        self.input_size = input_size
+
+        self.num_full_frames = 0
+        self.num_roi_frames = 0
+
+        self._lock = Lock()
+        self._boxes = np.zeros((0, 4), dtype=np.float32)
+        self._seq = -1
+        self._full_frame_seq = -self.full_frame_interval
+
+    @property
+    def stats(self):
+        return "ROI detector: {} full frames, {} ROI frames"\
+            .format(self.num_full_frames, self.num_roi_frames)
+
+    def _regions(self, shape):
+        height, width = shape[:2]
+        regions = []
+        for ymin, xmin, ymax, xmax in self._boxes:
+            box_height, box_width = (ymax - ymin) * height, \
+                (xmax - xmin) * width
+            pad = self.padding * max(box_height, box_width)
+            center_x, center_y = (xmin + xmax) / 2 * width, \
+                (ymin + ymax) / 2 * height
+            half_size = max(max(box_height, box_width) / 2 + pad,
+                            self.min_crop_size / 2)
+
+            regions.append((int(max(0, center_x - half_size)),
+                            int(max(0, center_y - half_size)),
+                            int(min(width, center_x + half_size)),
+                            int(min(height, center_y + half_size))))
+
+        return merge_regions(regions)
+
+    def _detect_regions(self, image, regions):
+        crops = [to_model_input(image[top:bottom, left:right],
+                                self.input_size)
+                 for left, top, right, bottom in regions]
+
+        crop_boxes, crop_scores = self.detector.detect_batch(crops)
+
+        boxes = np.concatenate([
+            boxes_to_frame(boxes, region, image.shape)
+            for region, boxes in zip(regions, crop_boxes)
+        ])
+        scores = np.concatenate(crop_scores)
+        order = np.argsort(-scores, kind='stable')
+
+        return boxes[order], scores[order]
+
+    def detect(self, image, seq):
+        with self._lock:
+            full_frame = not len(self._boxes) or \
+                seq - self._full_frame_seq >= self.full_frame_interval
+            if full_frame:
+                self._full_frame_seq = seq
+            else:
+                regions = self._regions(image.shape)
+
+        if full_frame:
+            boxes, scores = self.detector.detect(image, seq)
+            self.num_full_frames += 1
+        else:
+            boxes, scores = self._detect_regions(image, regions)
+            self.num_roi_frames += 1
+
+        with self._lock:
+            if seq > self._seq:
+                keep = np.argsort(-scores)[:self.num_hands_detect]
+                self._boxes = boxes[keep[scores[keep] > self.score_thresh]]
+                self._seq = seq
+
+        return pad_detections(boxes, scores, self.num_hands_detect)
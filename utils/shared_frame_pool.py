@@ -0,0 +1,62 @@
+from multiprocessing import shared_memory
+from queue import Queue
+from typing import List, Tuple
+
+import numpy as np
+
+
+class SharedFramePool:
+    """A fixed number of shared memory slots to move frames between processes.
+
+    Only the slot index (and the frame's shape) needs to be sent to another
+    process, the pixels themselves are never pickled. The process which
+    created the pool hands out free slots with `acquire()` and gets them back
+    with `release()`, other processes `attach()` to the existing slots."""
+
+    def __init__(self, num_slots: int, slot_size: int, names: List[str] = None):
+        self._owner = names is None
+
+        if self._owner:
+            self._slots = [shared_memory.SharedMemory(create=True,
+                                                      size=slot_size)
+                           for _ in range(num_slots)]
+        else:
+            self._slots = [shared_memory.SharedMemory(name=name)
+                           for name in names]
+
+        self._free_slots: 'Queue[int]' = Queue()
+        for i in range(len(self._slots)):
+            self._free_slots.put(i)
+
+    @classmethod
+    def attach(cls, names: List[str]) -> 'SharedFramePool':
+        return cls(len(names), 0, names)
+
+    @property
+    def names(self) -> List[str]:
+        return [slot.name for slot in self._slots]
+
+    def acquire(self) -> int:
+        """Blocks until a slot is free and returns its index."""
+        return self._free_slots.get()
+
+    def release(self, slot: int):
+        self._free_slots.put(slot)
+
+    def view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._slots[slot].buf)
+
+    def write(self, slot: int, image: np.ndarray) -> Tuple[int, ...]:
+        if image.nbytes > self._slots[slot].size:
+            raise ValueError("Frame of shape {} does not fit into a slot of "
+                             "{} bytes.".format(image.shape,
+                                                self._slots[slot].size))
+
+        np.copyto(self.view(slot, image.shape), image)
+        return image.shape
+
+    def close(self):
+        for slot in self._slots:
+            slot.close()
+            if self._owner:
+                slot.unlink()
@@ -0,0 +1,108 @@
+import time
+
+from collections import deque
+from typing import List, Tuple
+
+import numpy as np
+
+from .box_utils import boxes_to_frame, non_max_suppression, \
+    pad_detections
+from .preprocessing import to_model_input
+
+
+def parse_tile_layouts(text: str) -> List[Tuple[int, int]]:
+    """Parses a layout like "1x1,3x2" into [(1, 1), (3, 2)], which are the
+    number of tile columns and rows of every scale."""
+    layouts = []
+    for layout in text.split(','):
+        try:
+            columns, rows = (int(n) for n in layout.lower().split('x'))
+        except ValueError:
+            raise ValueError("Invalid tile layout {}, use e.g. 1x1,3x2."
+                             .format(layout))
+        layouts.append((columns, rows))
+
+    return layouts
+
+
+def _tile_offsets(length, num_tiles, overlap):
+    if num_tiles == 1:
+        return [(0, length)]
+
+    tile_length = length / (num_tiles - (num_tiles - 1) * overlap)
+    step = tile_length * (1 - overlap)
+
+    return [(int(round(i * step)),
+             min(length, int(round(i * step + tile_length))))
+            for i in range(num_tiles)]
+
+
+class TiledDetector:
+    """Splits the frame into overlapping tiles at one or more scales.
+
+    Each layout in `layouts` is a grid of (columns, rows) tiles, e.g.
+    [(1, 1), (3, 2)] runs the whole frame plus six tiles. All tiles are
+    scaled to the model's input size and run as one batch. The boxes are
+    mapped back to the whole frame and merged with class-agnostic non-maximum
+    suppression. The latency of the last frames is kept for reporting."""
+
+    def __init__(self, detector, num_hands_detect, layouts=((1, 1), (2, 2)),
+                 overlap=.2, iou_thresh=.5, score_thresh=.05,
+                 input_size=(300, 300), latency_window=100):
+        self.detector = detector
+        self.num_hands_detect = num_hands_detect
+        self.layouts = list(layouts)
+        self.overlap = overlap
+        self.iou_thresh = iou_thresh
+        self.score_thresh = score_thresh
+        self.input_size = input_size
+
+        self.latencies = deque(maxlen=latency_window)
+
+    @property
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        if not len(latencies):
+            return "Tiled detector: no frames"
+
+        return "Tiled detector: {} tiles per frame, latency mean {:.1f} ms, " \
+               "p95 {:.1f} ms, max {:.1f} ms"\
+            .format(sum(c * r for c, r in self.layouts), latencies.mean(),
+                    np.percentile(latencies, 95), latencies.max())
+
+    def regions(self, shape):
+        height, width = shape[:2]
+        regions = []
+        for columns, rows in self.layouts:
+            for top, bottom in _tile_offsets(height, rows, self.overlap):
+                for left, right in _tile_offsets(width, columns, self.overlap):
+                    regions.append((left, top, right, bottom))
+
+        return regions
+
+    def detect_batch(self, images):
+        return self.detector.detect_batch(images)
+
+    def detect(self, image, seq):
+        start = time.perf_counter()
+
+        regions = self.regions(image.shape)
+        tiles = [to_model_input(image[top:bottom, left:right],
+                                self.input_size)
+                 for left, top, right, bottom in regions]
+
+        tile_boxes, tile_scores = self.detector.detect_batch(tiles)
+
+        boxes = np.concatenate([
+            boxes_to_frame(boxes, region, image.shape)
+            for region, boxes in zip(regions, tile_boxes)
+        ])
+        scores = np.concatenate(tile_scores)
+
+        keep = non_max_suppression(boxes, scores, self.iou_thresh,
+                                   self.score_thresh)
+
+        self.latencies.append(time.perf_counter() - start)
+
+        return pad_detections(boxes[keep], scores[keep],
+                              self.num_hands_detect)
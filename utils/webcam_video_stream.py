@@ -1,3 +1,5 @@
+import time
+
 import cv2
 
 from queue import Queue
@@ -8,7 +10,7 @@ from threading import Thread
 # Source : Adrian Rosebrock
 # https://www.pyimagesearch.com/2017/02/06/faster-video-file-fps-with-cv2-videocapture-and-opencv/
 class WebcamVideoStream:
-    def __init__(self, src, width, height, queued=False):
+    def __init__(self, src, width=None, height=None, queued=False):
         # initialize the video camera stream and read the first frame
         # from the stream
         self.stream = cv2.VideoCapture(src)
@@ -16,10 +18,19 @@ class WebcamVideoStream:
         self.width = width
         self.height = height
 
-        if not queued:
-            (self.grabbed, self.frame) = self.stream.read()
+        (self.grabbed, frame) = self.stream.read()
+        self.frame = self._resize(frame)
+        # The frame together with the wall clock and the monotonic time
+        # it was grabbed at, replaced at once so they always match.
+        self.stamped_frame = (self.frame, time.time(), time.monotonic())
+        # Cameras don't always report the size of the frames they deliver,
+        # so it is taken from the first frame.
+        self.frame_size = None if self.frame is None else \
+            (self.frame.shape[1], self.frame.shape[0])
 
         self.queue = Queue() if queued else None
+        if self.queue is not None and self.grabbed:
+            self.queue.put(self.stamped_frame)
 
         # initialize the variable used to indicate if the thread should
         # be stopped
@@ -39,30 +50,47 @@ class WebcamVideoStream:
 
             if self.queue:
                 grabbed, frame = self.stream.read()
+                wall_time, monotonic_time = time.time(), time.monotonic()
 
                 if not grabbed:
                     self.stop()
                     return
 
-                self.queue.put(self._resize(frame))
+                self.queue.put((self._resize(frame), wall_time,
+                                monotonic_time))
             else:
                 (self.grabbed, frame) = self.stream.read()
+                wall_time, monotonic_time = time.time(), time.monotonic()
 
                 self.frame = self._resize(frame)
+                self.stamped_frame = (self.frame, wall_time, monotonic_time)
 
                 if not self.grabbed:
                     self.stop()
                     return
 
     def _resize(self, frame):
+        # Without a size, the frames are kept at the capture resolution and
+        # only scaled once by the consumer.
+        if frame is None or self.width is None or self.height is None:
+            return frame
+
         return cv2.resize(frame, (self.width, self.height))
 
     def read(self):
         # return the frame most recently read
-        return self.queue.get() if self.queue else self.frame
+        return self.read_stamped()[0]
+
+    def read_stamped(self):
+        """Returns the frame most recently read together with the wall clock
+        and the monotonic time it was grabbed at."""
+        return self.queue.get() if self.queue else self.stamped_frame
 
     def size(self):
-        # return size of the capture device
+        # return size of the frames, or of the capture device if there are
+        # none
+        if self.frame_size is not None:
+            return self.frame_size
         return self.stream.get(3), self.stream.get(4)
 
     def stop(self):
@@ -0,0 +1,90 @@
+# Compact binary format of the hand and marker messages, used by the
+# publishers with `--zmq-format binary`.
+#
+# A message consists of the topic, a fixed-size header and the detections of
+# one frame as a packed array of fixed-size records (little-endian):
+#
+#   header:  version (uint8), kind (uint8), number of detections (uint16),
+#            frame id (uint32), capture, inference and publish time
+#            (int64 each, milliseconds since the epoch, -1 if unknown)
+#   hands:   confidence (float32), box left, top, right, bottom (int32 each)
+#   markers: id (int32), corners as 4 x (x, y) (int32 each)
+#
+# With a conflated socket, topic, a space, the header and the records are
+# sent as a single message part. Subscribers only need this module (or its
+# NumPy dtypes) to decode the messages.
+
+import struct
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+VERSION = 1
+
+HANDS = 1
+MARKERS = 2
+
+HEADER = struct.Struct('<BBHIqqq')
+
+DTYPES = {
+    HANDS: np.dtype([('confidence', '<f4'), ('box', '<i4', (4,))]),
+    MARKERS: np.dtype([('id', '<i4'), ('corners', '<i4', (4, 2))]),
+}
+
+
+def encode_header(kind: int, num_detections: int, frame_id: int,
+                  capture_timestamp: int, inference_timestamp: int = None,
+                  publish_timestamp: int = None) -> bytes:
+    return HEADER.pack(VERSION, kind, num_detections, frame_id,
+                       capture_timestamp,
+                       -1 if inference_timestamp is None
+                       else inference_timestamp,
+                       -1 if publish_timestamp is None else publish_timestamp)
+
+
+def encode_hands(center_points: Sequence[Dict[str, Any]]) -> np.ndarray:
+    records = np.zeros(len(center_points), dtype=DTYPES[HANDS])
+    if len(center_points):
+        records['confidence'] = [center_point['confidence']
+                                 for center_point in center_points]
+        records['box'] = [center_point['box']
+                          for center_point in center_points]
+
+    return records
+
+
+def encode_markers(markers: Sequence[Dict[str, Any]]) -> np.ndarray:
+    records = np.zeros(len(markers), dtype=DTYPES[MARKERS])
+    if len(markers):
+        records['id'] = [marker['id'] for marker in markers]
+        records['corners'] = [marker['corners'] for marker in markers]
+
+    return records
+
+
+def decode(parts: List[bytes]) -> Dict[str, Any]:
+    """Decodes a message given as the header and the records (the parts
+    after the topic), or as a single part with the header followed by the
+    records. The detections are returned as a NumPy record array."""
+    data = b''.join(bytes(part) for part in parts)
+
+    version, kind, num_detections, frame_id, capture_timestamp, \
+        inference_timestamp, publish_timestamp = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError("Unsupported wire format version {}."
+                         .format(version))
+
+    detections = np.frombuffer(data, dtype=DTYPES[kind],
+                               count=num_detections, offset=HEADER.size)
+
+    return {
+        'kind': kind,
+        'frame_id': frame_id,
+        'capture_timestamp': capture_timestamp,
+        'inference_timestamp': None if inference_timestamp < 0
+        else inference_timestamp,
+        'publish_timestamp': None if publish_timestamp < 0
+        else publish_timestamp,
+        'detections': detections,
+    }
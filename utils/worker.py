@@ -1,46 +1,87 @@
-import copy
+import time
+import traceback
 
 from typing import Dict, Any
 from queue import Queue
-from threading import Thread
-from typing import NoReturn, List, Dict
+from threading import Lock, Thread
+from typing import Callable, NoReturn, List, Dict
 
-from cv2 import aruco
-
-from .detector_utils import load_inference_graph, detect_objects,\
-    get_center_points, draw_box_on_image
+from .aoi import Aoi
+from .aoi_engine import create_aoi_engine
+from .detector_utils import get_center_points
 from .calibration import Calibration
+from .frame import Frame
+from .hand_detection import hand_detector_stats
+from .marker_detection import create_marker_detector
+from .marker_scheduler import create_marker_scheduler
+from .pose_estimator import PoseEstimator
 from .synchronized_variable import SynchronizedVariable
 
-# 117 was found out by testing with static test-images. The real number of the
-#  markers created by the Pupil team is not known/does not work
-#  (see https://github.com/pupil-labs/pupil-helpers/tree/master/markers_stickersheet).
-_aruco_dict = aruco.Dictionary_create(117, 3)
-_aruco_parameters = aruco.DetectorParameters_create()
+# The fields of a frame filled in by the marker detection.
+_MARKER_FIELDS = ['marker_corners', 'marker_ids', 'markers',
+                  'undistorted_corners']
 
 
 class Worker:
-    def __init__(self, input_q: Queue, output_q: Queue, marker_q: Queue,
-                 center_points_q: Queue, cap_params: Dict[str, Any],
+    """Runs hand and marker detection as two long-lived pipeline stages.
+
+    Every frame from `input_q` is fanned out to both stages, each of which
+    has its own number of threads. A frame is put into `output_q` as soon as
+    both stages are done with it, which is tracked by its sequence number."""
+
+    def __init__(self, input_q: Queue, output_q: Queue,
+                 cap_params: Dict[str, Any], detector,
                  latest_markers: SynchronizedVariable[List[Dict]],
-                 calibration: Calibration = None):
+                 calibration: Calibration = None, num_hand_workers=1,
+                 num_marker_workers=1,
+                 aois: SynchronizedVariable[List[Aoi]] = None):
         self.input_q = input_q
         self.output_q = output_q
-        self.marker_q = marker_q
-        self.center_points_q = center_points_q
         self.cap_params = cap_params
         self.calibration = calibration
-        self.detection_graph, self.sess = load_inference_graph()
+        self.detector = detector
         self.latest_markers = latest_markers
-
-    def _detect_hands(self, frame, o_frame: SynchronizedVariable):
+        self.pose_estimator = PoseEstimator(calibration) \
+            if calibration is not None else None
+        self.aoi_engine = create_aoi_engine(aois, calibration, cap_params) \
+            if aois is not None else None
+        self.num_hand_workers = max(1, num_hand_workers)
+        self.num_marker_workers = max(1, num_marker_workers)
+        self.marker_detector = create_marker_detector(cap_params)
+        self.marker_scheduler = create_marker_scheduler(cap_params)
+
+        self._hand_q: 'Queue[Frame]' = Queue()
+        self._marker_q: 'Queue[Frame]' = Queue()
+
+        # Number of stages which still have to process a frame, by sequence
+        # number.
+        self._pending: Dict[int, int] = {}
+        self._pending_lock = Lock()
+
+        # The marker results of the latest scan, served to the frames on
+        # which the scheduler skips the detection.
+        self._marker_results: Dict[str, Any] = {}
+        self._marker_results_seq = -1
+        self._marker_results_lock = Lock()
+
+    @property
+    def stats(self) -> List[str]:
+        stats = hand_detector_stats(self.detector)
+        stats.append(self.marker_scheduler.stats)
+        if hasattr(self.marker_detector, 'stats'):
+            stats.append(self.marker_detector.stats)
+        if self.aoi_engine is not None:
+            stats.append(self.aoi_engine.stats)
+        return stats
+
+    def _detect_hands(self, result: Frame):
         # Actual detection. Variable boxes contains the bounding box
         # coordinates for hands detected, while scores contains the confidence
         # for each of these boxes.
         # Hint: If len(boxes) > 1 , you may assume you have found at least one
         # hand (within your score threshold)
 
-        boxes, scores = detect_objects(frame, self.detection_graph, self.sess)
+        boxes, scores = self.detector.detect(result.image, result.seq)
 
         center_points = get_center_points(self.cap_params["num_hands_detect"],
                                           self.cap_params["score_thresh"],
@@ -48,18 +89,31 @@ class Worker:
                                           self.cap_params["im_width"],
                                           self.cap_params["im_height"])
 
-        self.center_points_q.put(center_points)
+        result.boxes = boxes
+        result.scores = scores
+        result.center_points = center_points
+
+    def rescan_markers(self):
+        self.marker_scheduler.force_rescan()
+
+    def _detect_markers(self, result: Frame):
+        if not self.marker_scheduler.should_run(result.image, result.seq,
+                                                result.monotonic_time):
+            with self._marker_results_lock:
+                for field, value in self._marker_results.items():
+                    setattr(result, field, value)
+            return
 
-        with o_frame.lock:
-            draw_box_on_image(self.cap_params['num_hands_detect'],
-                              self.cap_params["score_thresh"],
-                              scores, boxes, self.cap_params['im_width'],
-                              self.cap_params['im_height'],
-                              o_frame.value)
+        self._scan_markers(result)
 
-    def _detect_markers(self, frame, o_frame: SynchronizedVariable):
-        corners, ids, _ = aruco.detectMarkers(frame, _aruco_dict,
-                                              parameters=_aruco_parameters)
+        with self._marker_results_lock:
+            if result.seq > self._marker_results_seq:
+                self._marker_results_seq = result.seq
+                self._marker_results = {field: getattr(result, field)
+                                        for field in _MARKER_FIELDS}
+
+    def _scan_markers(self, result: Frame):
+        corners, ids = self.marker_detector.detect(result.image, result.seq)
 
         if ids is None:
             return
@@ -74,47 +128,79 @@ class Worker:
 
         self.latest_markers.value = markers
 
-        self.marker_q.put(markers)
-
-        with o_frame.lock:
-            aruco.drawDetectedMarkers(o_frame.value, corners, ids)
+        result.marker_corners = corners
+        result.marker_ids = ids
+        result.markers = markers
 
-        if self.calibration is None:
-            return
+        # The poses are only estimated where they are needed, for the AOIs
+        # and for drawing the markers.
+        if self.pose_estimator is not None:
+            result.undistorted_corners = \
+                self.pose_estimator.undistort_corners(corners)
 
-        rotation_vecs, translation_vecs, _ = aruco.estimatePoseSingleMarkers(
-            corners, self.calibration.ml, self.calibration.camera_matrix,
-            self.calibration.dist_coeffs)
+    def _finish(self, frame: Frame):
+        with self._pending_lock:
+            self._pending[frame.seq] -= 1
+            done = self._pending[frame.seq] == 0
+            if done:
+                del self._pending[frame.seq]
 
-        with o_frame.lock:
-            for i in range(len(ids)):
-                aruco.drawAxis(o_frame.value, self.calibration.camera_matrix,
-                               self.calibration.dist_coeffs, rotation_vecs[i],
-                               translation_vecs[i], 0.01)
+        if not done:
+            return
 
-    def run(self) -> NoReturn:
+        try:
+            # The AOIs need both the hands and the markers.
+            if self.aoi_engine is not None:
+                self.aoi_engine.process(frame)
+        except Exception:
+            print("Locating the AOIs failed on frame {}:".format(frame.seq))
+            traceback.print_exc()
+        finally:
+            frame.inference_time = time.monotonic()
+            self.output_q.put(frame)
+
+    def _run_stage(self, stage_q: Queue, method: Callable[[Frame], None]) \
+            -> NoReturn:
+        while True:
+            frame = stage_q.get()
+            # A failing detection must not kill the stage, and the frame has
+            # to be passed on anyway, without the results of this stage.
+            # Otherwise the pipeline would wait for it forever.
+            try:
+                method(frame)
+            except Exception:
+                print("{} failed on frame {}:".format(method.__name__,
+                                                       frame.seq))
+                traceback.print_exc()
+            finally:
+                self._finish(frame)
+
+    def _fan_out(self) -> NoReturn:
         while True:
-            frame = self.input_q.get()
+            frame: Frame = self.input_q.get()
 
             if frame is None:
                 self.output_q.put(frame)
                 continue
 
-            # Create copy of frame to draw boxes on (we don't want to draw
-            # that on the input frame, because either of the detection
-            # algorithms could be disturbed by this).
-            o_frame = SynchronizedVariable(copy.deepcopy(frame))
+            # Both stages only read the frame, the results are stored in the
+            # frame record and drawn later, if the frame is displayed at all.
+            with self._pending_lock:
+                self._pending[frame.seq] = 2
+
+            self._hand_q.put(frame)
+            self._marker_q.put(frame)
 
-            threads = []
-            for method in [self._detect_hands, self._detect_markers]:
-                thr = Thread(target=method, args=(frame, o_frame))
-                thr.start()
-                threads.append(thr)
+    def start(self):
+        stages = [(self._hand_q, self._detect_hands, self.num_hand_workers),
+                  (self._marker_q, self._detect_markers,
+                   self.num_marker_workers)]
 
-            for thread in threads:
-                thread.join()
+        for stage_q, method, num_workers in stages:
+            for _ in range(num_workers):
+                Thread(target=self._run_stage, args=(stage_q, method),
+                       daemon=True).start()
 
-            self.output_q.put(o_frame.value)
+        Thread(target=self._fan_out, daemon=True).start()
 
-            # TODO Get translation matrices and draw AOI on image, BUT HOW DO
-            #  GET AOI HERE?
+        return self
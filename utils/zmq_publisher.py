@@ -1,24 +1,136 @@
 import time
 
-from threading import Thread
+from threading import Lock, Thread
 from queue import Queue
+from typing import Dict, List
 
+import numpy as np
 import zmq
 import msgpack as serializer
 
+from . import wire_format
+
+
+class PublisherConfig:
+    """Where and how the publishers send their messages.
+
+    By default, every publisher connects its own socket to `endpoint`. With
+    `bind`, the publishers share a single socket bound to `endpoint`
+    instead, since an endpoint can only be bound once. `send_hwm` limits the
+    number of messages queued per subscriber, `linger` (in milliseconds) how
+    long unsent messages are kept when a socket is closed. With `conflate`,
+    only the latest message of each publisher is kept; conflated sockets
+    can't send multi-part messages, so the topic and the payload are sent as
+    one part, separated by a space. Use an ipc:// endpoint if the subscriber
+    runs on the same host. All sockets share one context with `io_threads`
+    I/O threads."""
+
+    DEFAULT_ENDPOINT = "tcp://127.0.0.1:40002"
+
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, bind=False, send_hwm=1000,
+                 linger=None, conflate=False, io_threads=1):
+        if bind and conflate:
+            raise ValueError("Conflating needs one socket per publisher, "
+                             "which is only possible when connecting.")
+
+        self.endpoint = endpoint
+        self.bind = bind
+        self.send_hwm = send_hwm
+        self.linger = linger
+        self.conflate = conflate
+        self.io_threads = io_threads
+
+    def create_socket(self) -> zmq.Socket:
+        context = zmq.Context.instance(io_threads=self.io_threads)
+        socket = context.socket(zmq.PUB)
+        socket.setsockopt(zmq.SNDHWM, self.send_hwm)
+        if self.linger is not None:
+            socket.setsockopt(zmq.LINGER, self.linger)
+        if self.conflate:
+            socket.setsockopt(zmq.CONFLATE, 1)
+
+        return socket
+
+
+class _SharedSocket:
+    """A socket bound to an endpoint, shared by all publishers using it.
+
+    ZMQ sockets must not be used by several threads at once, hence the lock.
+    The socket is closed once the last publisher released it."""
+
+    _sockets: Dict[str, '_SharedSocket'] = {}
+    _sockets_lock = Lock()
+
+    def __init__(self, config: PublisherConfig):
+        self.endpoint = config.endpoint
+        self.socket = config.create_socket()
+        self.socket.bind(config.endpoint)
+        self.lock = Lock()
+        self.users = 0
+
+    @classmethod
+    def acquire(cls, config: PublisherConfig) -> '_SharedSocket':
+        with cls._sockets_lock:
+            if config.endpoint not in cls._sockets:
+                cls._sockets[config.endpoint] = cls(config)
+                print("Bound to {}".format(config.endpoint))
+
+            shared_socket = cls._sockets[config.endpoint]
+            shared_socket.users += 1
+
+        return shared_socket
+
+    def send_multipart(self, parts: List[bytes], **kwargs):
+        with self.lock:
+            self.socket.send_multipart(parts, **kwargs)
+
+    def close(self):
+        with self._sockets_lock:
+            self.users -= 1
+            if self.users == 0:
+                del self._sockets[self.endpoint]
+                self.socket.close()
+
 
 class ZmqPublisher(Thread):
-    def __init__(self, q: Queue, topic: str):
+    """Publishes the detections put into `q` as (frame id, capture time,
+    inference time, detections) tuples, with wall clock times in seconds.
+
+    By default, one message is sent per frame, with the frame id and the list
+    of its detections, so the detections of different topics can be matched
+    exactly. The `ITEM` format sends one packet per detection instead, as the
+    publishers did before. Either way, every packet carries the time the
+    frame was captured at, the time its results were available and the time
+    it was published, in milliseconds.
+
+    The `BINARY` format sends the messages of the `FRAME` format in the
+    compact layout of `wire_format`, if the publisher supports it (sets
+    `wire_kind`), and falls back to the `FRAME` format otherwise."""
+
+    FRAME = 'frame'
+    ITEM = 'item'
+    BINARY = 'binary'
+
+    formats = [FRAME, ITEM, BINARY]
+
+    # The kind of detections in `wire_format`, None if not supported.
+    wire_kind = None
+
+    def __init__(self, q: Queue, topic: str, message_format=FRAME,
+                 config: PublisherConfig = None):
         super().__init__()
         self.q = q
         self.topic = topic
+        self.message_format = message_format
+        self.config = config or PublisherConfig()
         self._cancel = False
 
-        context = zmq.Context()
-        self.publish_socket = context.socket(zmq.PUB)
-        address = "tcp://127.0.0.1:40002"
-        self.publish_socket.connect(address)
-        print("Connected to {}".format(address))
+        if self.config.bind:
+            self.publish_socket = _SharedSocket.acquire(self.config)
+        else:
+            self.publish_socket = self.config.create_socket()
+            self.publish_socket.connect(self.config.endpoint)
+            print("Connected to {}".format(self.config.endpoint))
 
     def run(self):
         while True:
@@ -27,16 +139,68 @@ class ZmqPublisher(Thread):
                 print("Stopping thread {}", self)
                 self.publish_socket.close()
                 break
-            for datum in data:
-                self.publish(self.create_sensor_packet_from_data(datum))
+
+            frame_id, capture_time, inference_time, detections = data
+            times = {"capture_timestamp": self.timestamp(capture_time),
+                     "inference_timestamp": self.timestamp(inference_time)
+                     if inference_time is not None else None}
+            self.publish_frame(frame_id, times, detections)
+
+    def publish_frame(self, frame_id, times, detections):
+        if self.message_format == self.BINARY and self.wire_kind:
+            self.publish_binary(frame_id, times, detections)
+        elif self.message_format == self.ITEM:
+            for datum in detections:
+                packet = self.create_sensor_packet_from_data(datum)
+                packet.update(times)
+                self.publish(packet)
+        else:
+            packet = self.create_frame_packet(frame_id, detections)
+            packet.update(times)
+            packet["publish_timestamp"] = self.timestamp()
+            self.publish(packet)
 
     def publish(self, data):
+        if self.config.conflate:
+            self.publish_socket.send(self.topic.encode("ASCII") + b" " +
+                                     serializer.dumps(data))
+            return
+
         self.publish_socket.send_multipart([
             self.topic.encode("ASCII"),
             serializer.dumps(data)
         ])
 
+    def publish_binary(self, frame_id, times, detections):
+        records = self.create_records(detections)
+        header = wire_format.encode_header(
+            self.wire_kind, len(records), frame_id, times["capture_timestamp"],
+            times["inference_timestamp"], self.timestamp())
+
+        if self.config.conflate:
+            self.publish_socket.send(self.topic.encode("ASCII") + b" " +
+                                     header + records.tobytes())
+            return
+
+        # The records are sent straight from their buffer.
+        self.publish_socket.send_multipart(
+            [self.topic.encode("ASCII"), header, records], copy=False)
+
+    def create_records(self, detections):
+        raise NotImplementedError("This method needs to be implemented by a "
+                                  "sub-class supporting the binary format.")
+
+    def create_frame_packet(self, frame_id, detections):
+        return {"frame_id": frame_id,
+                "detections": [self.create_detection(datum)
+                               for datum in detections]}
+
     def create_sensor_packet_from_data(self, datum):
+        packet = self.create_detection(datum)
+        packet["timestamp"] = self.timestamp()
+        return packet
+
+    def create_detection(self, datum):
         raise NotImplementedError("This method needs to be implemented by a "
                                   "sub-class.")
 
@@ -48,26 +212,116 @@ class ZmqPublisher(Thread):
             self.q.put(None)
 
     @staticmethod
-    def timestamp():
-        return int(round(time.time() * 1000))
+    def timestamp(seconds=None):
+        """Converts a wall clock time to milliseconds, by default now."""
+        if seconds is None:
+            seconds = time.time()
+        return int(round(seconds * 1000))
 
 
 class HandPositionPublisher(ZmqPublisher):
-    def __init__(self, q):
-        super().__init__(q, "han3")
+    wire_kind = wire_format.HANDS
 
-    def create_sensor_packet_from_data(self, datum):
+    def __init__(self, q, message_format=ZmqPublisher.FRAME,
+                 config: PublisherConfig = None):
+        super().__init__(q, "han3", message_format, config)
+
+    def create_records(self, detections):
+        return wire_format.encode_hands(detections)
+
+    def create_detection(self, datum):
         # TODO This adds a z-axis value of 0 to palm_position, that probably
         #  doesn't make any sense
         return {"position_source": "camera", "palm_position": [0, 0, 0],
-                "timestamp": self.timestamp(),
                 "confidence": datum['confidence'], "box": datum["box"]}
 
 
+class AoiPublisher(ZmqPublisher):
+    def __init__(self, q, message_format=ZmqPublisher.FRAME,
+                 config: PublisherConfig = None):
+        super().__init__(q, "aoi", message_format, config)
+
+    def create_detection(self, datum):
+        return {"aoi": datum["aoi"], "hand": datum["hand"],
+                "palm_position": datum["palm_position"],
+                "confidence": datum["confidence"]}
+
+
 class MarkerPublisher(ZmqPublisher):
-    def __init__(self, q):
-        super().__init__(q, "marker")
+    """Publishes the marker corners.
 
-    def create_sensor_packet_from_data(self, datum):
-        return {"corners": datum["corners"], "id": datum["id"],
-                "timestamp": self.timestamp()}
+    The markers hardly ever move, so with `delta`, a frame is only published
+    if a marker appeared, disappeared or one of its corners moved by more
+    than `delta_threshold` pixels since it was last published. Such a delta
+    message has the changed markers as `detections` and the ids of the
+    markers which disappeared as `removed`. Every `keyframe_interval` frames
+    (and on the first one), all markers are published with `keyframe` set,
+    which replaces the subscriber's state. Every message carries a
+    `sequence` number, counting up by one per message, so subscribers can
+    tell when they missed one and wait for the next keyframe. Delta messages
+    are always sent in the `FRAME` format."""
+
+    wire_kind = wire_format.MARKERS
+
+    def __init__(self, q, message_format=ZmqPublisher.FRAME,
+                 config: PublisherConfig = None, delta=False,
+                 delta_threshold=2., keyframe_interval=300):
+        super().__init__(q, "marker", message_format, config)
+        self.delta = delta
+        self.delta_threshold = delta_threshold
+        self.keyframe_interval = max(1, keyframe_interval)
+
+        self._sequence = 0
+        self._frames_since_keyframe = 0
+        # The corners of the markers as the subscribers know them, by id.
+        self._published: Dict[int, np.ndarray] = None
+
+    def publish_frame(self, frame_id, times, detections):
+        if not self.delta:
+            if detections:
+                super().publish_frame(frame_id, times, detections)
+            return
+
+        corners = {datum["id"]: np.asarray(datum["corners"], dtype=float)
+                   for datum in detections}
+
+        keyframe = self._published is None or \
+            self._frames_since_keyframe + 1 >= self.keyframe_interval
+        if keyframe:
+            changed = detections
+            removed = []
+            self._published = corners
+            self._frames_since_keyframe = 0
+        else:
+            self._frames_since_keyframe += 1
+            changed = [datum for datum in detections
+                       if self._has_moved(datum["id"], corners[datum["id"]])]
+            removed = [marker_id for marker_id in self._published
+                       if marker_id not in corners]
+            if not changed and not removed:
+                return
+
+            for datum in changed:
+                self._published[datum["id"]] = corners[datum["id"]]
+            for marker_id in removed:
+                del self._published[marker_id]
+
+        packet = self.create_frame_packet(frame_id, changed)
+        packet.update(times)
+        packet["removed"] = removed
+        packet["keyframe"] = keyframe
+        packet["sequence"] = self._sequence
+        packet["publish_timestamp"] = self.timestamp()
+        self.publish(packet)
+        self._sequence += 1
+
+    def _has_moved(self, marker_id, corners):
+        published = self._published.get(marker_id)
+        return published is None or \
+            np.abs(corners - published).max() > self.delta_threshold
+
+    def create_records(self, detections):
+        return wire_format.encode_markers(detections)
+
+    def create_detection(self, datum):
+        return {"corners": datum["corners"], "id": datum["id"]}